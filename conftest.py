@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_cache():
+    """Кеш тестов во временном каталоге, а не в CACHE_DIR разработки."""
+    from core.test_runner import isolated_cache
+
+    with isolated_cache() as directory:
+        yield directory
@@ -0,0 +1,486 @@
+"""
+Бэкенды кеша для нескольких процессов на одной машине.
+
+`SQLiteCache` — общий для всех процессов кеш в файле SQLite.
+`TwoTierCache` держит перед ним ограниченный по байтам LRU-кеш в памяти
+процесса; записи и удаления в любом процессе рассылаются остальным
+через `InvalidationBus`, чтобы они выбросили свои копии.
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Событие шины, после которого сбрасывается весь локальный кеш.
+CLEAR_ALL = '*'
+
+
+def _connect(path):
+    # В кеше лежат страницы и записи из базы: каталог и файлы доступны
+    # только владельцу. Файлы журнала SQLite получают права базы.
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+@contextmanager
+def _immediate(db):
+    """Транзакция, сразу блокирующая файл на запись."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield db
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+
+class _Connections(threading.local):
+    """Соединение с файлом SQLite на поток, заново после fork."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self.pid = None
+        self.connection = None
+
+    def get(self):
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = _connect(self.path)
+            self.connection.executescript(self.schema)
+            self.pid = os.getpid()
+        return self.connection
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кеш в файле SQLite `LOCATION`, общий для процессов одной машины.
+
+    `add` и `incr` выполняются в транзакции с блокировкой на запись,
+    поэтому атомарны между процессами. Просроченные записи удаляются
+    при чтении и при периодической чистке; если записей больше
+    MAX_ENTRIES, удаляется 1/CULL_FREQUENCY самых старых.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL
+        );
+    '''
+    # Чистка выполняется в среднем раз на столько записей.
+    cull_every = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._connections = _Connections(location, self.schema)
+
+    @property
+    def _db(self):
+        return self._connections.get()
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def get_many(self, keys, version=None):
+        names = {self.make_key(key, version=version): key for key in keys}
+        for name in names:
+            self.validate_key(name)
+        if not names:
+            return {}
+        rows = self._db.execute(
+            'SELECT key, value, expires FROM cache WHERE key IN (%s)'
+            % ', '.join('?' * len(names)), list(names)
+        ).fetchall()
+        now = time.time()
+        return {
+            names[name]: pickle.loads(value)
+            for name, value, expires in rows
+            if expires is None or expires > now
+        }
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        rows = []
+        for key, value in data.items():
+            name = self.make_key(key, version=version)
+            self.validate_key(name)
+            rows.append((name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                         expires))
+        self._db.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)', rows
+        )
+        self._maybe_cull()
+        return []
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self.make_key(key, version=version)
+        self.validate_key(name)
+        with _immediate(self._db) as db:
+            db.execute('DELETE FROM cache WHERE key = ? AND expires <= ?',
+                       (name, time.time()))
+            return db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 self._expires(timeout))
+            ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        name = self.make_key(key, version=version)
+        self.validate_key(name)
+        with _immediate(self._db) as db:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (name, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute('UPDATE cache SET value = ? WHERE key = ?',
+                       (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), name))
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self.make_key(key, version=version)
+        self.validate_key(name)
+        return self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), name, time.time())
+        ).rowcount == 1
+
+    def has_key(self, key, version=None):
+        return bool(self.get_many([key], version=version))
+
+    def delete_many(self, keys, version=None):
+        names = [self.make_key(key, version=version) for key in keys]
+        for name in names:
+            self.validate_key(name)
+        self._db.executemany('DELETE FROM cache WHERE key = ?',
+                             [(name,) for name in names])
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _maybe_cull(self):
+        if random.randrange(self.cull_every):
+            return
+        db = self._db
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache '
+                'ORDER BY rowid LIMIT ?)', (count // self._cull_frequency,)
+            )
+
+
+class InvalidationBus:
+    """
+    Шина событий между процессами одной машины на файле SQLite.
+
+    `publish` дописывает изменённые ключи в журнал, `poll` возвращает
+    ключи, изменённые другими процессами с прошлого вызова. Журнал
+    хранится `retention` секунд; если процесс отстал и часть событий
+    уже удалена, `poll` возвращает `CLEAR_ALL`.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL, key TEXT NOT NULL, at REAL NOT NULL
+        );
+    '''
+    prune_every = 1000
+
+    def __init__(self, path, retention=600):
+        self._connections = _Connections(path, self.schema)
+        self.retention = retention
+        self.pid = None
+        self.origin = None
+        self.last_seq = None
+
+    def _start(self):
+        # После fork у дочернего процесса свой источник событий.
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.origin = f'{self.pid}:{id(self)}'
+            self.last_seq = self._connections.get().execute(
+                'SELECT COALESCE(MAX(seq), 0) FROM events'
+            ).fetchone()[0]
+
+    def publish(self, keys):
+        self._start()
+        now = time.time()
+        db = self._connections.get()
+        db.executemany(
+            'INSERT INTO events (origin, key, at) VALUES (?, ?, ?)',
+            [(self.origin, key, now) for key in keys]
+        )
+        if not random.randrange(self.prune_every):
+            db.execute('DELETE FROM events WHERE at < ?',
+                       (now - self.retention,))
+
+    def poll(self):
+        self._start()
+        db = self._connections.get()
+        rows = db.execute(
+            'SELECT seq, origin, key FROM events WHERE seq > ? ORDER BY seq',
+            (self.last_seq,)
+        ).fetchall()
+        if not rows:
+            return []
+        # Пропуск в номерах — события удалены чисткой раньше, чем их
+        # прочитали (или запись откатилась): надёжнее сбросить всё.
+        missed = rows[0][0] > self.last_seq + 1
+        self.last_seq = rows[-1][0]
+        if missed:
+            return [CLEAR_ALL]
+        return [key for _, origin, key in rows if origin != self.origin]
+
+
+class LocalLRU:
+    """
+    LRU-кеш в памяти процесса, ограниченный суммарным размером
+    сериализованных значений в байтах. Общий для потоков процесса.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.RLock()
+        self.stats = defaultdict(Counter)
+        self.last_poll = 0.0
+
+    def count(self, key, event):
+        with self.lock:
+            self.stats[key.split(':', 1)[0]][event] += 1
+
+    def get(self, name):
+        """Сериализованное значение или `None`, если его нет или истекло."""
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return None
+            raw_key, data, expires = entry
+            if expires <= time.time():
+                self._discard(name)
+                return None
+            self.entries.move_to_end(name)
+            return data
+
+    def set(self, name, raw_key, data, expires):
+        with self.lock:
+            self._discard(name)
+            if len(data) > self.max_bytes // 8:
+                # Крупные значения только вытеснили бы всё остальное.
+                return
+            self.entries[name] = (raw_key, data, expires)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (evicted_key, evicted, _) = self.entries.popitem(
+                    last=False
+                )
+                self.size -= len(evicted)
+                self.count(evicted_key, 'eviction')
+
+    def _discard(self, name):
+        entry = self.entries.pop(name, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def discard(self, names):
+        with self.lock:
+            for name in names:
+                self._discard(name)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+# Локальные кеши процесса по имени настройки и файлу шины: Django создаёт
+# экземпляр бэкенда на каждый поток, а копия данных в процессе должна быть
+# одна. Кеш с другим файлом шины (например, в тестах) получает свою копию.
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Ограниченный по байтам LRU в памяти процесса перед общим кешем.
+
+    Параметры OPTIONS:
+
+    * SHARED — имя общего кеша в CACHES;
+    * LOCAL_MAX_BYTES — размер локального кеша в байтах;
+    * LOCAL_TIMEOUT — сколько секунд значение из общего кеша хранится
+      локально (меньше, если при записи задан меньший срок);
+    * BUS_LOCATION — файл шины событий;
+    * BUS_POLL_INTERVAL — как часто, в секундах, проверять шину: столько
+      же другие процессы могут видеть старое значение.
+
+    Чтения сначала идут в локальный кеш, запись, `add`, `incr`
+    и удаление — в общий, с обновлением локального и рассылкой
+    ключа остальным процессам.
+    """
+
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        super().__init__(params)
+        self.shared_alias = options['SHARED']
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self.poll_interval = options.get('BUS_POLL_INTERVAL', 0.05)
+        name = (location or self.shared_alias, options['BUS_LOCATION'])
+        with _local_caches_lock:
+            if name not in _local_caches:
+                _local_caches[name] = (
+                    LocalLRU(options.get('LOCAL_MAX_BYTES', 16 * 2 ** 20)),
+                    InvalidationBus(options['BUS_LOCATION'],
+                                    options.get('BUS_RETENTION', 600)),
+                )
+            self.local, self.bus = _local_caches[name]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def stats(self):
+        """Счётчики по префиксу ключа (до первого двоеточия) в процессе."""
+        with self.local.lock:
+            return {prefix: dict(events)
+                    for prefix, events in self.local.stats.items()}
+
+    def reset_stats(self):
+        with self.local.lock:
+            self.local.stats.clear()
+
+    def _sync(self):
+        """Выбрасывает локальные копии ключей, изменённых другими."""
+        now = time.monotonic()
+        with self.local.lock:
+            if now - self.local.last_poll < self.poll_interval:
+                return
+            self.local.last_poll = now
+            names = self.bus.poll()
+            if CLEAR_ALL in names:
+                self.local.clear()
+            else:
+                self.local.discard(names)
+
+    def _store_local(self, key, value, version, timeout=DEFAULT_TIMEOUT):
+        expires = time.time() + self.local_timeout
+        backend_timeout = self.get_backend_timeout(timeout)
+        if backend_timeout is not None:
+            expires = min(expires, backend_timeout)
+        self.local.set(self.make_key(key, version=version), key,
+                       pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+
+    def _changed(self, keys, version):
+        names = [self.make_key(key, version=version) for key in keys]
+        self.local.discard(names)
+        self.bus.publish(names)
+        for key in keys:
+            self.local.count(key, 'write')
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        for key in keys:
+            data = self.local.get(self.make_key(key, version=version))
+            if data is not None:
+                found[key] = pickle.loads(data)
+                self.local.count(key, 'local_hit')
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key in missing:
+                if key in shared:
+                    self._store_local(key, shared[key], version)
+                    self.local.count(key, 'shared_hit')
+                else:
+                    self.local.count(key, 'miss')
+            found.update(shared)
+        return found
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else (
+            timeout
+        )
+        self.shared.set_many(data, timeout=timeout, version=version)
+        self._changed(list(data), version)
+        for key, value in data.items():
+            self._store_local(key, value, version, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else (
+            timeout
+        )
+        if not self.shared.add(key, value, timeout=timeout, version=version):
+            return False
+        self._changed([key], version)
+        self._store_local(key, value, version, timeout)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._changed([key], version)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else (
+            timeout
+        )
+        touched = self.shared.touch(key, timeout=timeout, version=version)
+        self._changed([key], version)
+        return touched
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        self._changed(keys, version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+        self.bus.publish([CLEAR_ALL])
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
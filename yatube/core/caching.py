@@ -0,0 +1,113 @@
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+
+def _count(event):
+    with _metrics_lock:
+        _metrics[event] += 1
+
+
+def cache_metrics():
+    """
+    Счётчики событий `get_or_compute` в текущем процессе:
+    `hit`, `miss`, `expired`, `early_refresh`, `recomputed`,
+    `stale_served`, `coalesced` (дождались чужого пересчёта)
+    и `lock_timeout`.
+    """
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+def reset_cache_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def _store(key, value, delta, timeout, stale_timeout):
+    # Значение хранится дольше срока свежести, чтобы его можно было
+    # отдавать, пока один из запросов пересчитывает новое.
+    envelope = (value, time.time() + timeout, delta)
+    cache.set(key, envelope, timeout=timeout + stale_timeout)
+
+
+def _compute(key, compute, timeout, stale_timeout):
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    _store(key, value, delta, timeout, stale_timeout)
+    _count('recomputed')
+    return value
+
+
+def _is_fresh(expires_at, delta, beta):
+    # Вероятностное досрочное обновление (XFetch): чем ближе срок и чем
+    # дольше пересчёт, тем вероятнее, что запрос обновит значение заранее.
+    early = delta * beta * math.log(1.0 - random.random())
+    return time.time() - early < expires_at
+
+
+def _wait_for_value(key, compute, timeout, stale_timeout, lock_key,
+                    lock_timeout, wait):
+    """Ждёт, пока другой запрос сохранит значение, или считает его сам."""
+    deadline = time.time() + lock_timeout
+    while not cache.add(lock_key, 1, timeout=lock_timeout):
+        if time.time() >= deadline:
+            _count('lock_timeout')
+            logger.warning('Cache lock wait timed out for %s', key)
+            return _compute(key, compute, timeout, stale_timeout)
+        time.sleep(wait)
+        envelope = cache.get(key)
+        if envelope is not None:
+            _count('coalesced')
+            return envelope[0]
+    try:
+        envelope = cache.get(key)
+        if envelope is not None:
+            _count('coalesced')
+            return envelope[0]
+        return _compute(key, compute, timeout, stale_timeout)
+    finally:
+        cache.delete(lock_key)
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None, beta=1.0,
+                   lock_timeout=10, wait=0.05):
+    """
+    Значение из кеша или результат `compute()`, сохранённый на `timeout`.
+
+    Пересчёт выполняет только тот запрос, который захватил блокировку
+    `<key>:lock`; остальные в это время получают устаревшее значение
+    (ещё `stale_timeout` секунд после срока) или, если его нет, ждут
+    результата до `lock_timeout` секунд.
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+    lock_key = f'{key}:lock'
+    envelope = cache.get(key)
+    if envelope is None:
+        _count('miss')
+        return _wait_for_value(key, compute, timeout, stale_timeout,
+                               lock_key, lock_timeout, wait)
+    value, expires_at, delta = envelope
+    if _is_fresh(expires_at, delta, beta):
+        _count('hit')
+        return value
+    if not cache.add(lock_key, 1, timeout=lock_timeout):
+        _count('stale_served')
+        return value
+    _count('early_refresh' if time.time() < expires_at else 'expired')
+    try:
+        return _compute(key, compute, timeout, stale_timeout)
+    finally:
+        cache.delete(lock_key)
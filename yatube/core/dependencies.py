@@ -0,0 +1,151 @@
+"""
+Зависимости закешированных данных от записей моделей.
+
+Закешированный элемент (страница или её часть) помечается тегами вида
+`post:<id>` или `user:<username>`, у каждого тега в кеше есть версия.
+Вместе с элементом запоминается `stamp` его тегов; `invalidate` меняет
+версии, и элемент с прежним отпечатком считается устаревшим.
+
+Что от чего зависит, объявляется через `depends_on`: тег и модель,
+изменение записей которой его затрагивает. Обработчики `post_save`
+и `post_delete` подключаются к модели при первом объявлении и сбрасывают
+ровно объявленные теги, поэтому сроки хранения могут быть большими.
+"""
+import hashlib
+import uuid
+from collections import defaultdict, namedtuple
+
+from django.core.cache import cache
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+
+PREFIX = 'deps'
+# Тег, от которого зависит всё: сбрасывает закешированные данные целиком.
+ALL = 'all'
+
+Dependency = namedtuple('Dependency', 'tag values fields')
+
+_registry = defaultdict(list)
+
+
+def _tag_key(tag):
+    return f'{PREFIX}:{tag}'
+
+
+def invalidate(*tags):
+    """Делает недействительными данные, зависящие от любого из тегов."""
+    # Версия — случайная строка, а не счётчик: если тег вытеснен из кеша
+    # и создан заново, старые данные всё равно не совпадут с ним.
+    tags = {tag for tag in tags if tag}
+    if tags:
+        cache.set_many(
+            {_tag_key(tag): uuid.uuid4().hex for tag in tags},
+            timeout=None,
+        )
+
+
+def versions(tags):
+    """Текущие версии тегов вместе с ALL, недостающие создаются."""
+    keys = [_tag_key(tag) for tag in (ALL, *tags)]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+        found.update(cache.get_many(missing))
+    return found
+
+
+def stamp(tags):
+    """Короткий отпечаток версий тегов для ключа или проверки кеша."""
+    found = versions(tags)
+    parts = '&'.join(f'{key}={found.get(key)}' for key in sorted(found))
+    return hashlib.md5(parts.encode()).hexdigest()
+
+
+def depends_on(tag, model, values=None, fields=None):
+    """
+    Объявляет, что данные с тегом `tag` зависят от записей `model`.
+
+    `values(instance)` возвращает параметры шаблона тега, затронутые
+    изменением записи: последовательность словарей или queryset
+    `.values()`. Без `values` тег сбрасывается при изменении любой
+    записи. С `fields` сохранение, не поменявшее этих полей, тег
+    не сбрасывает.
+    """
+    if model not in _registry:
+        _connect(model)
+    _registry[model].append(
+        Dependency(tag, values, frozenset(fields) if fields else None)
+    )
+
+
+def _connect(model):
+    uid = f'{PREFIX}:{model._meta.label}'
+    pre_save.connect(_remember_previous, sender=model, dispatch_uid=uid)
+    post_save.connect(_saved, sender=model, dispatch_uid=uid)
+    pre_delete.connect(_deleting, sender=model, dispatch_uid=uid)
+    post_delete.connect(_deleted, sender=model, dispatch_uid=uid)
+
+
+def _tags(dependency, instance):
+    if dependency.values is None:
+        return [dependency.tag]
+    return [dependency.tag.format(**params)
+            for params in dependency.values(instance)]
+
+
+def _skipped(dependency, update_fields):
+    return (dependency.fields is not None and update_fields is not None
+            and not dependency.fields & update_fields)
+
+
+def _changed(dependency, instance, previous):
+    if dependency.fields is None or previous is None:
+        return True
+    return any(getattr(instance, field) != getattr(previous, field)
+               for field in dependency.fields)
+
+
+def _remember_previous(sender, instance, raw=False, update_fields=None,
+                       **kwargs):
+    # Прежнее состояние записи нужно, чтобы сбросить и старые теги:
+    # например, группу, из которой перенесли пост.
+    instance._dependencies_previous = None
+    if raw or instance._state.adding or all(
+        _skipped(dependency, update_fields)
+        for dependency in _registry[sender]
+    ):
+        return
+    instance._dependencies_previous = sender._default_manager.filter(
+        pk=instance.pk
+    ).first()
+
+
+def _saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_dependencies_previous', None)
+    tags = set()
+    for dependency in _registry[sender]:
+        if _skipped(dependency, update_fields) or not _changed(
+            dependency, instance, previous
+        ):
+            continue
+        tags.update(_tags(dependency, instance))
+        if previous is not None:
+            tags.update(_tags(dependency, previous))
+    invalidate(*tags)
+
+
+def _deleting(sender, instance, **kwargs):
+    # Теги считаются до удаления: после него связанные записи уже
+    # удалены каскадом или отвязаны.
+    instance._dependencies_tags = {
+        tag for dependency in _registry[sender]
+        for tag in _tags(dependency, instance)
+    }
+
+
+def _deleted(sender, instance, **kwargs):
+    invalidate(*getattr(instance, '_dependencies_tags', ()))
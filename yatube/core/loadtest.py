@@ -0,0 +1,351 @@
+"""
+Нагрузочный прогон WSGI-приложения `yatube.wsgi.application` без сети.
+
+Запросы строятся сценариями (`index`, `group_posts`, `profile`, …) по
+случайной выборке существующих данных и выполняются пулом потоков или
+процессов. По каждому сценарию считаются перцентили задержки, пропускная
+способность, число запросов к базе (из заголовка `Server-Timing`,
+который добавляет `core.middleware.QueryBudgetMiddleware`) и доля
+попаданий в кеш страниц (из заголовка `X-Page-Cache`).
+
+Сценарии `new_post` и `add_comment` создают настоящие записи в базе,
+поэтому по умолчанию не выполняются: их нужно разрешить явно
+(`allow_writes=True`, в команде — `--allow-writes`).
+"""
+import math
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from io import BytesIO
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connections
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+from .page_cache import hit_ratio
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+# Сценарий: (вес по умолчанию, нужен ли вход, пишет ли в базу,
+# функция построения запроса).
+SCENARIOS = {}
+
+
+def scenario(name, weight, login=False, writes=False):
+    def register(build):
+        SCENARIOS[name] = (weight, login, writes, build)
+        return build
+    return register
+
+
+@scenario('index', 30)
+def index_request(data, rng):
+    return 'GET', reverse('index'), None
+
+
+@scenario('group_posts', 15)
+def group_request(data, rng):
+    return 'GET', reverse('group', args=[rng.choice(data['groups'])]), None
+
+
+@scenario('profile', 15)
+def profile_request(data, rng):
+    return 'GET', reverse('profile', args=[rng.choice(data['users'])]), None
+
+
+@scenario('post_view', 20)
+def post_view_request(data, rng):
+    username, post_id = rng.choice(data['posts'])
+    return 'GET', reverse('post_view', args=[username, post_id]), None
+
+
+@scenario('follow_index', 10, login=True)
+def follow_request(data, rng):
+    return 'GET', reverse('follow_index'), None
+
+
+@scenario('new_post', 3, login=True, writes=True)
+def new_post_request(data, rng):
+    return 'POST', reverse('new_post'), {'text': 'Нагрузочный пост'}
+
+
+@scenario('add_comment', 7, login=True, writes=True)
+def add_comment_request(data, rng):
+    username, post_id = rng.choice(data['posts'])
+    url = reverse('add_comment', args=[username, post_id])
+    return 'POST', url, {'text': 'Нагрузочный комментарий'}
+
+
+def percentile(values, fraction):
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not values:
+        return None
+    rank = max(math.ceil(fraction * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def writing_scenarios(names=None):
+    """Сценарии из `names` (по умолчанию из всех), которые пишут в базу."""
+    return sorted(name for name in (names or SCENARIOS)
+                  if SCENARIOS[name][2])
+
+
+def choose_scenarios(scenarios=None, allow_writes=False):
+    """
+    Сценарии прогона. Без явного списка пишущие сценарии выполняются,
+    только если `allow_writes`; явно названные без разрешения — ошибка.
+    """
+    if scenarios:
+        writes = writing_scenarios(scenarios)
+        if writes and not allow_writes:
+            raise ValueError(
+                f'Сценарии {", ".join(writes)} создают записи в базе: '
+                'разрешите их явно (--allow-writes).'
+            )
+        return list(scenarios)
+    return [name for name in SCENARIOS
+            if allow_writes or not SCENARIOS[name][2]]
+
+
+def csrf_token_pair():
+    """Значение куки CSRF и токен формы, как их выдал бы сайт браузеру."""
+    request = HttpRequest()
+    token = get_token(request)
+    return request.META['CSRF_COOKIE'], token
+
+
+def sample_data(sample_size, users_with_sessions, seed):
+    """Случайная выборка групп, авторов и постов, а также сессии входа."""
+    rng = random.Random(seed)
+    data = {
+        'groups': list(Group.objects.order_by('?').values_list(
+            'slug', flat=True)[:sample_size]),
+        'users': list(User.objects.filter(posts__isnull=False).distinct()
+                      .order_by('?').values_list('username', flat=True)
+                      [:sample_size]),
+        'posts': list(Post.objects.order_by('?').values_list(
+            'author__username', 'id')[:sample_size]),
+        'sessions': [],
+    }
+    if not data['posts']:
+        raise ValueError('В базе нет постов: запустите generate_dataset.')
+    readers = User.objects.filter(follower__isnull=False).distinct()
+    for user in readers.order_by('?')[:users_with_sessions]:
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        data['sessions'].append(session.session_key)
+    rng.shuffle(data['sessions'])
+    return data
+
+
+def drop_sessions(data):
+    SessionStore.get_model_class().objects.filter(
+        session_key__in=data['sessions']
+    ).delete()
+
+
+def call_wsgi(application, method, path, form, session_key):
+    body = urlencode(form or {}).encode()
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'REMOTE_ADDR': '10.0.0.1',
+        'wsgi.input': BytesIO(body),
+        'CONTENT_LENGTH': str(len(body)),
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'wsgi.errors': sys.stderr,
+    }
+    cookies = SimpleCookie()
+    if session_key:
+        cookies[settings.SESSION_COOKIE_NAME] = session_key
+    if method == 'POST':
+        cookie, token = csrf_token_pair()
+        cookies[settings.CSRF_COOKIE_NAME] = cookie
+        environ['HTTP_X_CSRFTOKEN'] = token
+    if cookies:
+        environ['HTTP_COOKIE'] = cookies.output(header='', sep=';').strip()
+    setup_testing_defaults(environ)
+
+    status_holder = {}
+
+    def start_response(status, headers, exc_info=None):
+        status_holder['status'] = int(status.split()[0])
+        status_holder['headers'] = dict(headers)
+
+    started = time.perf_counter()
+    result = application(environ, start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    elapsed = time.perf_counter() - started
+    match = SERVER_TIMING_QUERIES.search(
+        status_holder['headers'].get('Server-Timing', '')
+    )
+    queries = int(match.group(1)) if match else None
+    page_cache = status_holder['headers'].get('X-Page-Cache')
+    return status_holder['status'], elapsed, queries, page_cache
+
+
+def run_worker(plan, data, seed, close_connections=True):
+    """Выполняет часть плана и возвращает результаты отдельных запросов."""
+    from yatube.wsgi import application
+
+    rng = random.Random(seed)
+    results = []
+    try:
+        for name, logged_in in plan:
+            _, login, _, build = SCENARIOS[name]
+            method, path, form = build(data, rng)
+            session_key = None
+            if (login or logged_in) and data['sessions']:
+                session_key = rng.choice(data['sessions'])
+            results.append((name,) + call_wsgi(
+                application, method, path, form, session_key
+            ))
+    finally:
+        if close_connections:
+            connections.close_all()
+    return results
+
+
+def make_plan(requests, weights, anonymous_ratio, seed):
+    rng = random.Random(seed)
+    names = list(weights)
+    plan = []
+    for name in rng.choices(names, [weights[n] for n in names], k=requests):
+        login = SCENARIOS[name][1]
+        plan.append((name, login or rng.random() >= anonymous_ratio))
+    return plan
+
+
+def run(requests=1000, concurrency=4, mode='thread', scenarios=None,
+        anonymous_ratio=0.7, seed=0, sample_size=200, warmup=20,
+        allow_writes=False):
+    """Запускает прогон и возвращает сводку по сценариям."""
+    weights = {
+        name: SCENARIOS[name][0]
+        for name in choose_scenarios(scenarios, allow_writes)
+    }
+    data = sample_data(sample_size, max(concurrency * 2, 10), seed)
+    try:
+        run_worker(make_plan(warmup, weights, anonymous_ratio, seed), data,
+                   seed, close_connections=False)
+        plan = make_plan(requests, weights, anonymous_ratio, seed + 1)
+        chunks = [plan[i::concurrency] for i in range(concurrency)]
+        started = time.perf_counter()
+        if concurrency == 1:
+            results = run_worker(chunks[0], data, seed,
+                                 close_connections=False)
+        else:
+            connections.close_all()
+            pool_class = (
+                ProcessPoolExecutor if mode == 'process'
+                else ThreadPoolExecutor
+            )
+            with pool_class(max_workers=concurrency) as pool:
+                futures = [
+                    pool.submit(run_worker, chunk, data, seed + i)
+                    for i, chunk in enumerate(chunks)
+                ]
+                results = [
+                    row for future in futures for row in future.result()
+                ]
+        wall_time = time.perf_counter() - started
+    finally:
+        drop_sessions(data)
+    return summarize(results, wall_time, concurrency, mode)
+
+
+def summarize(results, wall_time, concurrency, mode):
+    by_name = defaultdict(list)
+    for row in results:
+        by_name[row[0]].append(row)
+    summary = {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'mode': mode,
+        'wall_time': wall_time,
+        'throughput': len(results) / wall_time if wall_time else None,
+        'scenarios': {},
+    }
+    for name, rows in sorted(by_name.items()):
+        latencies = sorted(row[2] * 1000 for row in rows)
+        queries = [row[3] for row in rows if row[3] is not None]
+        page_cache = Counter(row[4] for row in rows if row[4])
+        summary['scenarios'][name] = {
+            'requests': len(rows),
+            'errors': sum(1 for row in rows if row[1] >= 500),
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'mean_ms': sum(latencies) / len(latencies),
+            'queries': sum(queries) / len(queries) if queries else None,
+            'page_cache_hit_ratio': hit_ratio(page_cache),
+        }
+    return summary
+
+
+def compare(summary, baseline, threshold=0.2, metric='p95_ms'):
+    """
+    Список регрессий относительно `baseline`: `metric` или среднее число
+    запросов к базе выросли больше чем на `threshold`, либо появились
+    ошибки.
+    """
+    regressions = []
+    for name, current in summary['scenarios'].items():
+        if current['errors']:
+            regressions.append(f'{name}: {current["errors"]} errors')
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for key in (metric, 'queries'):
+            before, after = previous.get(key), current.get(key)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + threshold) and after - before > 1e-9:
+                regressions.append(
+                    f'{name}: {key} {before:.2f} -> {after:.2f}'
+                )
+    return regressions
+
+
+def format_summary(summary):
+    lines = [
+        f'{summary["requests"]} requests, {summary["concurrency"]} '
+        f'{summary["mode"]} workers, {summary["wall_time"]:.2f} s, '
+        f'{summary["throughput"]:.1f} req/s',
+        f'{"scenario":<14}{"n":>6}{"err":>5}{"p50":>9}{"p95":>9}'
+        f'{"p99":>9}{"queries":>9}{"cached":>8}',
+    ]
+    for name, row in summary['scenarios'].items():
+        queries = '-' if row['queries'] is None else f'{row["queries"]:.1f}'
+        ratio = row.get('page_cache_hit_ratio')
+        cached = '-' if ratio is None else f'{ratio:.0%}'
+        lines.append(
+            f'{name:<14}{row["requests"]:>6}{row["errors"]:>5}'
+            f'{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}'
+            f'{row["p99_ms"]:>9.1f}{queries:>9}{cached:>8}'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон страниц сайта через WSGI-приложение '
+        'с отчётом о задержках и сравнением с сохранённым базовым прогоном.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--mode', choices=('thread', 'process'), default='thread'
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            choices=sorted(loadtest.SCENARIOS),
+            help='Сценарий прогона; можно указать несколько раз.'
+        )
+        parser.add_argument(
+            '--allow-writes', action='store_true',
+            help='Выполнять сценарии, которые создают посты и комментарии '
+                 'в базе. Записи остаются после прогона.'
+        )
+        parser.add_argument(
+            '--anonymous-ratio', type=float, default=0.7,
+            help='Доля анонимных запросов в сценариях без обязательного входа.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--output', help='Куда сохранить отчёт в JSON.')
+        parser.add_argument(
+            '--baseline', help='Отчёт базового прогона для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый относительный рост p95 и числа запросов.'
+        )
+
+    def handle(self, *args, **options):
+        if options['allow_writes']:
+            writes = loadtest.writing_scenarios(options['scenarios'])
+            if writes:
+                self.stderr.write(self.style.WARNING(
+                    f'Сценарии {", ".join(writes)} создадут в базе записи, '
+                    'которые останутся после прогона. Не запускайте их '
+                    'на рабочей базе.'
+                ))
+        try:
+            summary = loadtest.run(
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                mode=options['mode'],
+                scenarios=options['scenarios'],
+                anonymous_ratio=options['anonymous_ratio'],
+                seed=options['seed'],
+                warmup=options['warmup'],
+                allow_writes=options['allow_writes'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(loadtest.format_summary(summary))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(summary, output, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = loadtest.compare(
+                    summary, json.load(baseline), options['threshold']
+                )
+            if regressions:
+                raise CommandError(
+                    'Регрессия производительности:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write('Регрессий нет.')
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import microbench
+
+
+class Command(BaseCommand):
+    help = (
+        'Микробенчмарки пагинации, шаблонов, миниатюр и форм '
+        'с сохранением результатов в JSON для сравнения между коммитами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*', metavar='benchmark',
+            help=f'Бенчмарки: {", ".join(microbench.BENCHMARKS)}.'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--number', type=int,
+            help='Вызовов в серии; по умолчанию подбирается автоматически.'
+        )
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', help='Куда сохранить результаты.')
+        parser.add_argument(
+            '--compare', help='Результаты прошлого прогона для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Рост медианы, при котором прогон считается регрессией.'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(microbench.BENCHMARKS)
+        if unknown:
+            raise CommandError(f'Нет бенчмарков: {", ".join(sorted(unknown))}')
+        results = microbench.run(
+            options['names'],
+            repeat=options['repeat'],
+            number=options['number'],
+            warmup=options['warmup'],
+        )
+        changes = None
+        if options['compare']:
+            with open(options['compare']) as previous:
+                changes = microbench.compare(
+                    results, json.load(previous), options['threshold']
+                )
+        self.stdout.write(microbench.format_results(results, changes))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+        if changes and any(row['regression'] for row in changes.values()):
+            raise CommandError('Медиана выросла больше допустимого.')
@@ -0,0 +1,204 @@
+"""
+Микробенчмарки отдельных слоёв: пагинации, шаблонов, миниатюр и форм.
+
+Каждый бенчмарк — функция подготовки, которая возвращает замеряемую
+функцию без аргументов или `None`, если для замера нет данных.
+Результаты в JSON можно сравнивать между коммитами через `compare`.
+"""
+import gc
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import Paginator
+from django.template.loader import get_template
+
+from posts import thumbnails
+from posts.forms import CommentForm, PostForm
+from posts.models import Group, Post
+from posts.paginator import CursorPaginator
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _deep_page_number(queryset, per_page):
+    return max(queryset.count() // per_page // 2, 1)
+
+
+@benchmark('paginator_offset_deep')
+def paginator_offset_deep():
+    queryset = Post.objects.select_related('author', 'group')
+    number = _deep_page_number(queryset, 10)
+
+    def run():
+        list(Paginator(queryset, 10).get_page(number).object_list)
+    return run
+
+
+@benchmark('paginator_cursor_deep')
+def paginator_cursor_deep():
+    queryset = Post.objects.select_related('author', 'group')
+    paginator = CursorPaginator(queryset, 10)
+    offset = _deep_page_number(queryset, 10) * 10
+    middle = queryset.order_by(*paginator.ordering)[offset:offset + 1]
+    if not middle:
+        return None
+    cursor = paginator.encode_cursor(middle[0], 1)
+
+    def run():
+        list(CursorPaginator(queryset, 10).page_after(cursor).object_list)
+    return run
+
+
+def _post_card(count):
+    posts = list(Post.objects.select_related('author', 'group')[:count])
+    if len(posts) < count:
+        return None
+    template = get_template('includes/post_card.html')
+    user = AnonymousUser()
+
+    def run():
+        for post in posts:
+            template.render({'post': post, 'user': user})
+    return run
+
+
+@benchmark('render_post_card_10')
+def render_post_card_10():
+    return _post_card(10)
+
+
+@benchmark('render_post_card_100')
+def render_post_card_100():
+    return _post_card(100)
+
+
+@benchmark('render_paginator_deep')
+def render_paginator_deep():
+    queryset = Post.objects.all()
+    paginator = CursorPaginator(queryset, 10)
+    page = paginator.page_number(_deep_page_number(queryset, 10))
+    template = get_template('includes/paginator.html')
+
+    def run():
+        template.render({'page': page})
+    return run
+
+
+@benchmark('thumbnail_lookup')
+def thumbnail_lookup():
+    post = Post.objects.exclude(image='').exclude(image__isnull=True).first()
+    if post is None:
+        return None
+    thumbnails.build(post.image, post.image_width)
+
+    def run():
+        thumbnails.card_image(post.image, post.image_width)
+    return run
+
+
+@benchmark('post_form_validation')
+def post_form_validation():
+    group = Group.objects.first()
+    data = {'text': 'Тестовый пост ' * 20, 'group': group.pk if group else ''}
+
+    def run():
+        PostForm(data).is_valid()
+    return run
+
+
+@benchmark('comment_form_validation')
+def comment_form_validation():
+    data = {'text': 'Тестовый комментарий ' * 10}
+
+    def run():
+        CommentForm(data).is_valid()
+    return run
+
+
+def measure(func, repeat=5, number=None, warmup=3, target=0.2):
+    """
+    Время одного вызова `func` в секундах по `repeat` сериям.
+    Если `number` не задан, серия подбирается длиной около `target` секунд.
+    """
+    for _ in range(warmup):
+        func()
+    if number is None:
+        number = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - started >= target or number >= 10 ** 6:
+                break
+            number *= 2
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            timings.append((time.perf_counter() - started) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def run(names=None, **options):
+    results = {}
+    for name in names or BENCHMARKS:
+        func = BENCHMARKS[name]()
+        results[name] = None if func is None else measure(func, **options)
+    return results
+
+
+def compare(current, previous, threshold=0.1):
+    """Относительное изменение медианы по бенчмаркам, общим для обоих."""
+    changes = {}
+    for name, row in current.items():
+        before = previous.get(name)
+        if not row or not before:
+            continue
+        change = row['median'] / before['median'] - 1
+        changes[name] = {
+            'before': before['median'],
+            'after': row['median'],
+            'change': change,
+            'regression': change > threshold,
+        }
+    return changes
+
+
+def format_results(results, changes=None):
+    lines = [f'{"benchmark":<26}{"median":>12}{"min":>12}{"stdev":>12}'
+             f'{"change":>10}']
+    for name, row in results.items():
+        if row is None:
+            lines.append(f'{name:<26}{"skipped (no data)":>36}')
+            continue
+        change = ''
+        if changes and name in changes:
+            change = f'{changes[name]["change"] * 100:+.1f}%'
+        lines.append(
+            f'{name:<26}{row["median"] * 1e6:>10.1f}us'
+            f'{row["min"] * 1e6:>10.1f}us{row["stdev"] * 1e6:>10.1f}us'
+            f'{change:>10}'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+
+from . import dependencies, page_cache
+from .query_budget import QueryCounter, check
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает запросы к базе и время их выполнения для каждого запроса,
+    сверяет их с `settings.QUERY_BUDGETS` по имени URL и добавляет
+    в ответ заголовок `Server-Timing`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryCounter().capture() as counter:
+            response = self.get_response(request)
+        response['Server-Timing'] = (
+            f'db;dur={counter.db_time * 1000:.2f};'
+            f'desc="{counter.queries} queries"'
+        )
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name:
+            check(match.url_name, counter)
+        return response
+
+
+class PageCacheMiddleware:
+    """
+    Отдаёт анонимным читателям готовые страницы из кеша, не доходя
+    до сессий, аутентификации и представления. Результат запроса
+    виден в заголовке `X-Page-Cache`: `hit`, `miss`, `stale` или
+    `bypass`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return self.get_response(request)
+        tags = page_cache.page_tags(match)
+        if tags is None:
+            return self.get_response(request)
+        view = match.url_name
+        anonymous = page_cache.is_anonymous(request)
+        if request.method not in ('GET', 'HEAD') or not anonymous or (
+            not page_cache.has_cacheable_query(request)
+        ):
+            return self._respond(view, 'bypass', self.get_response(request))
+        key = page_cache.page_key(request)
+        entry = cache.get(key)
+        stamp = dependencies.stamp(tags)
+        if entry is not None and entry[0] == stamp:
+            return self._respond(view, 'hit', page_cache.thaw(entry[1]))
+        response = self.get_response(request)
+        if page_cache.is_storable(request, response):
+            cache.set(key, (stamp, page_cache.freeze(response)),
+                      settings.PAGE_CACHE_TIMEOUT)
+            page_cache.count(view, 'stored')
+        return self._respond(view, 'miss' if entry is None else 'stale',
+                             response)
+
+    def _respond(self, view, event, response):
+        page_cache.count(view, event)
+        response['X-Page-Cache'] = event
+        return response
@@ -0,0 +1,157 @@
+"""
+Кеш отдельных записей моделей для частых поисков по ключу.
+
+`get_cached(Group, slug=...)` ищет запись по первичному ключу или
+уникальному полю сначала в кеше, потом в базе. Запись хранится под
+ключом первичного ключа, поиск по другому полю хранит только ссылку
+«значение → pk» и сверяет поле найденной записи: после переименования
+старая ссылка просто промахивается. Отсутствие записи тоже кешируется,
+на меньший срок, чтобы запросы несуществующих страниц не шли в базу.
+
+Для моделей с секретными полями (пароль пользователя) при регистрации
+задаётся список полей, которые можно хранить в кеше; остальные поля
+не загружаются и в кеш не попадают.
+
+Сохранение и удаление записи заменяют её ключ и ссылки на её текущие
+значения «надгробием» на OBJECT_CACHE_TOMBSTONE_TIMEOUT секунд, а запись
+из базы кладётся в кеш через `add`. Так запрос, прочитавший строку
+до изменения, не вернёт старую версию в кеш после сброса: `add` не
+перезапишет надгробие. Изменения через `QuerySet.update()` сигналов
+не посылают, после них нужно вызывать `forget`.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+
+PREFIX = 'object'
+MISSING = 'object_cache:missing'
+TOMBSTONE = 'object_cache:tombstone'
+
+# Поля, которые хранятся в кеше, по модели; `None` — все поля.
+_fields = {}
+
+
+def _lookup_field(model, lookup):
+    if len(lookup) != 1:
+        raise ValueError('Нужно ровно одно поле поиска.')
+    name, value = next(iter(lookup.items()))
+    field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+    if not (field.primary_key or field.unique):
+        raise ValueError(f'Поле {name} не уникально.')
+    return field, field.to_python(value)
+
+
+def _object_key(model, pk):
+    return f'{PREFIX}:{model._meta.label_lower}:{pk}'
+
+
+def _pointer_key(model, field, value):
+    return f'{PREFIX}:{model._meta.label_lower}:{field.name}={value}'
+
+
+def _does_not_exist(model, field, value):
+    return model.DoesNotExist(
+        f'{model._meta.object_name} {field.name}={value!r} не найден.'
+    )
+
+
+def _fetch(model, field, value, key):
+    """Запись из базы; результат, в том числе отсутствие, кешируется."""
+    queryset = model._default_manager.filter(**{field.name: value})
+    if _fields.get(model):
+        queryset = queryset.only(*_fields[model])
+    instance = queryset.first()
+    if instance is None:
+        cache.add(key, MISSING, settings.OBJECT_CACHE_MISS_TIMEOUT)
+        raise _does_not_exist(model, field, value)
+    cache.add(_object_key(model, instance.pk), instance,
+              settings.OBJECT_CACHE_TIMEOUT)
+    if not field.primary_key:
+        # Ссылку можно перезаписать: найденная по ней запись всё равно
+        # сверяется со значением поля.
+        cache.set(key, instance.pk, settings.OBJECT_CACHE_TIMEOUT)
+    return instance
+
+
+def get_cached(model, **lookup):
+    """
+    Запись `model` по первичному ключу или уникальному полю, например
+    `get_cached(User, username='leo')`. Если записи нет, бросается
+    `model.DoesNotExist`, как у `QuerySet.get()`.
+    """
+    field, value = _lookup_field(model, lookup)
+    if field.primary_key:
+        key = _object_key(model, value)
+        cached = cache.get(key)
+    else:
+        key = _pointer_key(model, field, value)
+        pk = cache.get(key)
+        cached = pk
+        if pk not in (None, MISSING, TOMBSTONE):
+            cached = cache.get(_object_key(model, pk))
+            if not isinstance(cached, model) or (
+                getattr(cached, field.attname) != value
+            ):
+                cached = None
+    if cached == MISSING:
+        raise _does_not_exist(model, field, value)
+    if not isinstance(cached, model):
+        return _fetch(model, field, value, key)
+    return cached
+
+
+def get_cached_or_404(model, **lookup):
+    try:
+        return get_cached(model, **lookup)
+    except model.DoesNotExist:
+        raise Http404(f'{model._meta.object_name} не найден.')
+
+
+def _bury(keys):
+    cache.set_many(dict.fromkeys(keys, TOMBSTONE),
+                   settings.OBJECT_CACHE_TOMBSTONE_TIMEOUT)
+
+
+def forget(model, *pks):
+    """Сбрасывает закешированные записи `model` с первичными ключами `pks`."""
+    _bury(_object_key(model, pk) for pk in pks if pk is not None)
+
+
+def _instance_keys(model, instance):
+    keys = [_object_key(model, instance.pk)]
+    for field in model._meta.concrete_fields:
+        if field.unique and not field.primary_key:
+            value = getattr(instance, field.attname)
+            keys.append(_pointer_key(model, field, value))
+    return keys
+
+
+def _changed(sender, instance, **kwargs):
+    # Вместе с записью сбрасываются ссылки на её значения, в том числе
+    # закешированное отсутствие записи с таким значением.
+    _bury(_instance_keys(sender, instance))
+
+
+def register(model, fields=None):
+    """
+    Подключает сброс кеша записей `model` при сохранении и удалении.
+    Если заданы `fields`, в кеш попадают только эти поля.
+    """
+    _fields[model] = tuple(fields) if fields else None
+    uid = f'{PREFIX}:{model._meta.label}'
+    post_save.connect(_changed, sender=model, dispatch_uid=uid)
+    post_delete.connect(_changed, sender=model, dispatch_uid=uid)
+
+
+class CachedManager(models.Manager):
+    """Менеджер с поиском записи через кеш: `Model.objects.get_cached()`."""
+
+    def contribute_to_class(self, model, name):
+        super().contribute_to_class(model, name)
+        if not model._meta.abstract:
+            register(model)
+
+    def get_cached(self, **lookup):
+        return get_cached(self.model, **lookup)
@@ -0,0 +1,117 @@
+"""
+Кеш готовых страниц для анонимных читателей.
+
+Кешируются GET-ответы страниц из `settings.PAGE_CACHE_VIEWS` по пути
+вместе с параметрами пагинации (`after`, `before`, `page`). Запросы
+с любыми другими параметрами идут мимо кеша: иначе каждая новая строка
+запроса занимала бы в кеше место настоящих страниц. Запросы с cookie
+сессии или сообщений тоже идут мимо кеша: у вошедших пользователей
+страница своя (меню, форма комментария), а анонимная версия одинакова
+для всех. Не сохраняются
+ответы, которые ставят cookie или использовали CSRF-токен, и страницы
+с заглушками вместо ещё не построенных миниатюр: иначе заглушка
+показывалась бы из кеша и после того, как миниатюра готова.
+
+Каждая страница зависит от тегов (`index`, `group:<slug>`,
+`user:<username>`, `post:<id>`) из `core.dependencies`. Вместе
+со страницей запоминается отпечаток версий её тегов на момент начала
+рендеринга; изменения записей, от которых зависят теги, меняют версии,
+и такие страницы при следующем запросе считаются устаревшими
+и строятся заново.
+"""
+import hashlib
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+
+PREFIX = 'page_cache'
+BYPASS_COOKIES = ('messages',)
+PAGE_PARAMS = ('after', 'before', 'page')
+# Метки в HTML временного содержимого, которое нельзя кешировать.
+PENDING_MARKERS = (b'data-pending-image',)
+
+_metrics = defaultdict(Counter)
+_metrics_lock = threading.Lock()
+
+
+def count(view, event):
+    with _metrics_lock:
+        _metrics[view][event] += 1
+
+
+def page_cache_metrics():
+    """
+    Счётчики кеша страниц в текущем процессе по имени URL: `hit`,
+    `miss`, `stale` (страница устарела), `bypass` (запрос с сессией,
+    посторонними параметрами или не GET) и `stored`.
+    """
+    with _metrics_lock:
+        return {view: dict(events) for view, events in _metrics.items()}
+
+
+def reset_page_cache_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def hit_ratio(events):
+    """Доля попаданий среди запросов, которые могли попасть в кеш."""
+    lookups = sum(events.get(name, 0) for name in ('hit', 'miss', 'stale'))
+    return events.get('hit', 0) / lookups if lookups else None
+
+
+def page_tags(match):
+    """Теги страницы по настройке PAGE_CACHE_VIEWS или `None`."""
+    templates = settings.PAGE_CACHE_VIEWS.get(match.url_name)
+    if templates is None:
+        return None
+    return [template.format(**match.kwargs) for template in templates]
+
+
+def has_cacheable_query(request):
+    """В строке запроса только параметры пагинации, каждый по разу."""
+    return all(
+        name in PAGE_PARAMS and len(request.GET.getlist(name)) == 1
+        for name in request.GET
+    )
+
+
+def page_key(request):
+    params = '&'.join(
+        f'{name}={request.GET[name]}'
+        for name in PAGE_PARAMS if name in request.GET
+    )
+    digest = hashlib.md5(f'{request.path}?{params}'.encode()).hexdigest()
+    return f'{PREFIX}:page:{digest}'
+
+
+def is_anonymous(request):
+    cookies = (settings.SESSION_COOKIE_NAME,) + BYPASS_COOKIES
+    return not any(name in request.COOKIES for name in cookies)
+
+
+def is_storable(request, response):
+    return (
+        request.method == 'GET'
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and 'private' not in response.get('Cache-Control', '')
+        and 'no-store' not in response.get('Cache-Control', '')
+        and not any(marker in response.content for marker in PENDING_MARKERS)
+    )
+
+
+def freeze(response):
+    return response.status_code, response.content, list(response.items())
+
+
+def thaw(frozen):
+    status, content, headers = frozen
+    response = HttpResponse(content, status=status)
+    for header, value in headers:
+        response[header] = value
+    return response
@@ -0,0 +1,88 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """Считает SQL-запросы и их суммарное время во всех подключениях."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+def get_budget(url_name):
+    """Бюджет представления: `{'queries': n, 'db_time': секунды}`."""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    budget = dict(budgets.get('default', {}))
+    budget.update(budgets.get(url_name, {}))
+    return budget
+
+
+def violations(counter, budget):
+    found = []
+    if 'queries' in budget and counter.queries > budget['queries']:
+        found.append(f'{counter.queries} queries > {budget["queries"]}')
+    if 'db_time' in budget and counter.db_time > budget['db_time']:
+        found.append(
+            f'{counter.db_time * 1000:.1f} ms'
+            f' > {budget["db_time"] * 1000:.1f} ms'
+        )
+    return found
+
+
+def check(url_name, counter, action=None, budget=None):
+    """Сообщает о превышении бюджета в лог или исключением."""
+    if budget is None:
+        budget = get_budget(url_name)
+    found = violations(counter, budget)
+    if not found:
+        return
+    message = f'Query budget exceeded for {url_name}: {", ".join(found)}'
+    action = action or getattr(settings, 'QUERY_BUDGET_ACTION', 'log')
+    if action == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@contextmanager
+def assert_query_budget(url_name, db_time=False):
+    """
+    Для тестов: блок кода должен уложиться в бюджет `url_name`.
+
+        with assert_query_budget('index'):
+            self.client.get(reverse('index'))
+
+    По умолчанию проверяется только число запросов: время зависит
+    от нагрузки на машину, и тест с ним был бы нестабильным.
+    """
+    budget = get_budget(url_name)
+    if not db_time:
+        budget.pop('db_time', None)
+    with QueryCounter().capture() as counter:
+        yield counter
+    check(url_name, counter, action='raise', budget=budget)
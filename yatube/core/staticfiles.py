@@ -0,0 +1,83 @@
+"""
+Статика с хешем содержимого в имени и заранее сжатыми копиями.
+
+`collectstatic` с `CompressedManifestStaticFilesStorage` копирует файлы
+в STATIC_ROOT, добавляет к ним версии с хешем в имени и манифест
+`staticfiles.json` (как `ManifestStaticFilesStorage`), а рядом с текстовыми
+файлами кладёт сжатые `.gz` и, если установлен пакет `brotli`, `.br`.
+Отдаёт их `core.views.serve_static`.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml',
+    '.ico', '.eot', '.ttf', '.otf',
+)
+# Меньшие файлы не сжимаются: выигрыш съедят заголовки.
+MIN_COMPRESS_SIZE = 256
+
+
+def compressors():
+    """Пары (расширение, функция сжатия) в порядке предпочтения."""
+    result = []
+    if brotli is not None:
+        result.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    result.append(('.gz', lambda data: gzip.compress(data, 9, mtime=0)))
+    return result
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Файлы, которых нет в манифесте (например, до `collectstatic`
+    # или в тестах), подключаются под исходными именами.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def compress(self, name):
+        """Кладёт рядом с файлом сжатые копии, если они заметно меньше."""
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        with self.open(name) as file:
+            data = file.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for extension, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) >= len(data) * 0.95:
+                continue
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(compressed))
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if not isinstance(processed, Exception):
+                names.add(name)
+                if hashed_name:
+                    names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            if os.path.exists(self.path(name)):
+                self.compress(name)
+
+    def is_hashed(self, name):
+        """Имя файла с хешем содержимого из манифеста."""
+        return name in self.hashed_files.values()
@@ -0,0 +1,60 @@
+"""
+Запуск тестов с кешем во временном каталоге.
+
+Кеш проекта хранится в файлах в CACHE_DIR. Тесты очищают кеш, поэтому
+с общим каталогом они стирали бы кеш запущенного сервера, а сервер
+подмешивал бы тестам свои записи. `isolated_cache` переносит файлы кеша
+во временный каталог на время тестов: его включает `IsolatedCacheRunner`
+для `manage.py test` и `conftest.py` в корне репозитория для pytest.
+"""
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Параметры кешей с путями к файлам.
+PATH_OPTIONS = ('LOCATION', 'BUS_LOCATION')
+
+
+def _relocated(caches, source, target):
+    """Копия CACHES, в которой файлы из `source` перенесены в `target`."""
+    caches = copy.deepcopy(caches)
+    for alias in caches.values():
+        for options in (alias, alias.get('OPTIONS', {})):
+            for name in PATH_OPTIONS:
+                path = options.get(name)
+                if path and os.path.dirname(path) == source:
+                    options[name] = os.path.join(
+                        target, os.path.basename(path)
+                    )
+    return caches
+
+
+@contextmanager
+def isolated_cache():
+    """Кеш во временном каталоге, который удаляется после выхода."""
+    directory = tempfile.mkdtemp(prefix='yatube-test-cache-')
+    caches = _relocated(settings.CACHES, settings.CACHE_DIR, directory)
+    try:
+        with override_settings(CACHE_DIR=directory, CACHES=caches):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    """`DiscoverRunner`, который запускает тесты с `isolated_cache`."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._isolated_cache = isolated_cache()
+        self._isolated_cache.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._isolated_cache.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
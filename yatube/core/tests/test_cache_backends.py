@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core.cache_backends import SQLiteCache, TwoTierCache
+from core.test_runner import isolated_cache
+
+CACHE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SHARED = {
+    'BACKEND': 'core.cache_backends.SQLiteCache',
+    'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+}
+
+
+def two_tier(name, max_bytes=1024 * 1024):
+    """Кеш с собственным локальным уровнем, как в отдельном процессе."""
+    return TwoTierCache(name, {'OPTIONS': {
+        'SHARED': 'shared',
+        'LOCAL_MAX_BYTES': max_bytes,
+        'BUS_LOCATION': os.path.join(CACHE_DIR, 'bus.sqlite3'),
+        'BUS_POLL_INTERVAL': 0,
+    }})
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    """Тестируется общий кеш в файле SQLite."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = SQLiteCache(SHARED['LOCATION'], {})
+        self.cache.clear()
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, читаются пачкой и удаляются."""
+        self.cache.set('a', {'x': 1})
+        self.cache.set_many({'b': 2, 'c': [3]})
+        self.assertEqual(self.cache.get('a'), {'x': 1})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'z']),
+                         {'a': {'x': 1}, 'b': 2})
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.has_key('c'))
+
+    def test_expiry(self):
+        """Просроченное значение не возвращается, и `add` его заменяет."""
+        self.cache.set('a', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.add('a', 2))
+        self.assertFalse(self.cache.add('a', 3))
+        self.assertEqual(self.cache.get('a'), 2)
+
+    def test_incr(self):
+        """`incr` и `decr` меняют число, для отсутствующего ключа — ошибка."""
+        self.cache.set('n', 1)
+        self.assertEqual(self.cache.incr('n', 5), 6)
+        self.assertEqual(self.cache.decr('n'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_cull(self):
+        """При переполнении удаляются самые старые записи."""
+        cache = SQLiteCache(SHARED['LOCATION'], {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2},
+        })
+        cache.cull_every = 1
+        for i in range(11):
+            cache.set(f'k{i}', i)
+        self.assertIsNone(cache.get('k0'))
+        self.assertEqual(cache.get('k10'), 10)
+
+
+@override_settings(CACHES={'default': SHARED, 'shared': SHARED})
+class TwoTierCacheTests(SimpleTestCase):
+    """Тестируется двухуровневый кеш и рассылка изменений."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.first = two_tier(f'first-{self._testMethodName}')
+        self.second = two_tier(f'second-{self._testMethodName}')
+        self.first.clear()
+
+    def test_local_hit_skips_shared(self):
+        """Повторное чтение обслуживается из памяти процесса."""
+        self.first.set('page:1', 'html')
+        with mock.patch.object(SQLiteCache, 'get_many') as get_many:
+            self.assertEqual(self.first.get('page:1'), 'html')
+        get_many.assert_not_called()
+        self.assertEqual(self.second.get('page:1'), 'html')
+        self.assertEqual(self.second.stats()['page'],
+                         {'shared_hit': 1})
+
+    def test_write_invalidates_other_processes(self):
+        """Запись в одном процессе сбрасывает копию в другом."""
+        self.first.set('post:1', 'old')
+        self.assertEqual(self.second.get('post:1'), 'old')
+        self.first.set('post:1', 'new')
+        self.assertEqual(self.second.get('post:1'), 'new')
+        self.first.delete('post:1')
+        self.assertIsNone(self.second.get('post:1'))
+
+    def test_incr_invalidates_other_processes(self):
+        """Счётчик, изменённый в одном процессе, виден в другом."""
+        self.first.set('version', 1)
+        self.assertEqual(self.second.get('version'), 1)
+        self.first.incr('version')
+        self.assertEqual(self.second.get('version'), 2)
+
+    def test_clear_invalidates_other_processes(self):
+        """Очистка кеша сбрасывает локальные копии всех процессов."""
+        self.first.set('a', 1)
+        self.second.get('a')
+        self.first.clear()
+        self.assertIsNone(self.second.get('a'))
+
+    def test_local_size_is_bounded_in_bytes(self):
+        """Локальный уровень вытесняет давние записи по размеру."""
+        cache = two_tier(f'small-{self._testMethodName}', max_bytes=4096)
+        for i in range(20):
+            cache.set(f'card:{i}', 'x' * 400)
+        self.assertLessEqual(cache.local.size, 4096)
+        self.assertGreater(cache.stats()['card']['eviction'], 0)
+        self.assertEqual(cache.get('card:0'), 'x' * 400)
+
+    def test_add_is_shared(self):
+        """`add` атомарен между процессами."""
+        self.assertTrue(self.first.add('lock', 1))
+        self.assertFalse(self.second.add('lock', 1))
+        self.first.delete('lock')
+        self.assertTrue(self.second.add('lock', 1))
+
+    def test_stats_by_prefix(self):
+        """Счётчики ведутся по префиксу ключа."""
+        self.first.reset_stats()
+        self.first.get('page:1')
+        self.first.set('page:1', 'html')
+        self.first.get('page:1')
+        self.first.get('card:1')
+        stats = self.first.stats()
+        self.assertEqual(stats['page'],
+                         {'miss': 1, 'write': 1, 'local_hit': 1})
+        self.assertEqual(stats['card'], {'miss': 1})
+
+
+class IsolatedCacheTests(SimpleTestCase):
+    """Тестируется перенос кеша тестов во временный каталог."""
+
+    def test_tests_use_temporary_directory(self):
+        """Тесты пишут кеш во временный каталог, а не в каталог проекта."""
+        cache.set('isolated', 1)
+        self.assertTrue(settings.CACHE_DIR.startswith(tempfile.gettempdir()))
+        self.assertTrue(os.path.exists(
+            os.path.join(settings.CACHE_DIR, 'cache.sqlite3')
+        ))
+
+    def test_isolated_cache(self):
+        """Файлы кешей переносятся, остальные параметры не меняются."""
+        with isolated_cache() as directory:
+            caches = settings.CACHES
+            self.assertEqual(settings.CACHE_DIR, directory)
+            self.assertEqual(caches['shared']['LOCATION'],
+                             os.path.join(directory, 'cache.sqlite3'))
+            self.assertEqual(caches['default']['OPTIONS']['BUS_LOCATION'],
+                             os.path.join(directory, 'bus.sqlite3'))
+            self.assertEqual(caches['default']['OPTIONS']['SHARED'],
+                             'shared')
+        self.assertFalse(os.path.exists(directory))
@@ -0,0 +1,65 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core import caching
+
+
+class GetOrComputeTests(SimpleTestCase):
+    """Тестируется защита от одновременного пересчёта кеша."""
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_cache_metrics()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'value {self.calls}'
+
+    def test_value_is_computed_once(self):
+        """Повторный запрос берёт значение из кеша."""
+        for _ in range(3):
+            value = caching.get_or_compute('key', self.compute, timeout=60)
+        self.assertEqual(value, 'value 1')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(caching.cache_metrics()['hit'], 2)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой запрос пересчитывает, отдаётся старое значение."""
+        caching._store('key', 'old', 0, timeout=-1, stale_timeout=60)
+        cache.add('key:lock', 1)
+        value = caching.get_or_compute('key', self.compute, timeout=60)
+        self.assertEqual(value, 'old')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(caching.cache_metrics()['stale_served'], 1)
+
+    def test_miss_waits_for_other_computation(self):
+        """Промах при чужой блокировке дожидается готового значения."""
+        cache.add('key:lock', 1)
+
+        def finish():
+            time.sleep(0.1)
+            caching._store('key', 'shared', 0, timeout=60, stale_timeout=60)
+            cache.delete('key:lock')
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        value = caching.get_or_compute(
+            'key', self.compute, timeout=60, wait=0.01
+        )
+        thread.join()
+        self.assertEqual(value, 'shared')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(caching.cache_metrics()['coalesced'], 1)
+
+    def test_early_refresh(self):
+        """Долгий пересчёт обновляется до истечения срока."""
+        caching._store('key', 'old', 100, timeout=60, stale_timeout=60)
+        with mock.patch('core.caching.random.random', return_value=0.9):
+            value = caching.get_or_compute('key', self.compute, timeout=60)
+        self.assertEqual(value, 'value 1')
+        self.assertEqual(caching.cache_metrics()['early_refresh'], 1)
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from core import dependencies
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class DependencyRegistryTests(TestCase):
+    """Тестируется сброс тегов кеша при изменении записей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.other_group = Group.objects.create(title='Другая', slug='other',
+                                               description='Описание')
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        cls.comment = Comment.objects.create(post=cls.post,
+                                             author=cls.reader, text='Да')
+
+    def setUp(self):
+        cache.clear()
+        # Записи из setUpTestData общие для тестов: берём свежие копии.
+        self.group = Group.objects.get(pk=self.group.pk)
+        self.reader = User.objects.get(pk=self.reader.pk)
+        self.post = Post.objects.get(pk=self.post.pk)
+        self.tags = (
+            'index', 'group:group', 'group:other', 'user:author',
+            'user:reader', f'post:{self.post.pk}',
+        )
+
+    def changed_tags(self, change):
+        """Теги, версии которых поменялись в `change`."""
+        before = dependencies.versions(self.tags)
+        change()
+        after = dependencies.versions(self.tags)
+        return {key.split(':', 1)[1] for key in before
+                if before[key] != after[key]}
+
+    def test_new_post(self):
+        """Новый пост сбрасывает главную, группу и автора."""
+        changed = self.changed_tags(lambda: Post.objects.create(
+            text='Новый', author=self.author, group=self.other_group
+        ))
+        self.assertEqual(changed, {'index', 'group:other', 'user:author'})
+
+    def test_post_moved_to_other_group(self):
+        """Перенос поста сбрасывает прежнюю и новую группу."""
+        def move():
+            self.post.group = self.other_group
+            self.post.save()
+        self.assertEqual(self.changed_tags(move), {
+            'index', 'group:group', 'group:other', 'user:author',
+            f'post:{self.post.pk}',
+        })
+
+    def test_comment(self):
+        """Комментарий сбрасывает страницы, где виден пост."""
+        changed = self.changed_tags(lambda: Comment.objects.create(
+            post=self.post, author=self.reader, text='Ещё'
+        ))
+        self.assertEqual(changed, {
+            'index', 'group:group', 'user:author', f'post:{self.post.pk}',
+        })
+
+    def test_follow(self):
+        """Подписка сбрасывает только профили обоих пользователей."""
+        changed = self.changed_tags(lambda: Follow.objects.create(
+            user=self.reader, author=self.author
+        ))
+        self.assertEqual(changed, {'user:author', 'user:reader'})
+
+    def test_unchanged_user_save_keeps_pages(self):
+        """Вход и сохранение без смены имени кеш не сбрасывают."""
+        def login():
+            self.reader.save(update_fields=['last_login'])
+            self.reader.first_name = 'Иван'
+            self.reader.save()
+        self.assertEqual(self.changed_tags(login), set())
+
+    def test_renamed_commenter(self):
+        """Смена имени сбрасывает страницы с комментариями пользователя."""
+        def rename():
+            self.reader.username = 'renamed'
+            self.reader.save()
+        self.assertEqual(self.changed_tags(rename), {
+            'index', 'user:reader', f'post:{self.post.pk}',
+        })
+
+    def test_group_deleted(self):
+        """Удаление группы сбрасывает страницы её постов."""
+        self.assertEqual(self.changed_tags(self.group.delete), {
+            'index', 'group:group', 'user:author', f'post:{self.post.pk}',
+        })
+
+    def test_invalidate_all(self):
+        """Тег ALL меняет отпечаток любых тегов."""
+        before = dependencies.stamp(['index'])
+        self.assertEqual(dependencies.stamp(['index']), before)
+        dependencies.invalidate(dependencies.ALL)
+        self.assertNotEqual(dependencies.stamp(['index']), before)
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from core import loadtest
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class LoadTestTests(TestCase):
+    """Тестируется нагрузочный прогон и сравнение с базовым."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        group = Group.objects.create(
+            title='Заголовок тестовой группы',
+            slug='test-group',
+            description='Тестовый текст'
+        )
+        author = User.objects.create(username='MrSmith')
+        reader = User.objects.create(username='MrAnon')
+        Follow.objects.create(user=reader, author=author)
+        for _ in range(3):
+            Post.objects.create(
+                text='Тестовый пост', author=author, group=group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_run_reports_all_scenarios(self):
+        """Прогон выполняет сценарии и считает задержки и запросы."""
+        summary = loadtest.run(requests=70, concurrency=1, warmup=0,
+                               allow_writes=True)
+        self.assertEqual(summary['requests'], 70)
+        self.assertEqual(
+            set(summary['scenarios']), set(loadtest.SCENARIOS)
+        )
+        for name, row in summary['scenarios'].items():
+            with self.subTest(scenario=name):
+                self.assertEqual(row['errors'], 0)
+                self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+                self.assertIsNotNone(row['queries'])
+        # Формы с токеном CSRF проходят проверку и создают записи.
+        self.assertGreater(Post.objects.count(), 3)
+
+    def test_writes_are_opt_in(self):
+        """Сценарии, создающие записи, без разрешения не выполняются."""
+        posts = Post.objects.count()
+        summary = loadtest.run(requests=30, concurrency=1, warmup=0)
+        self.assertFalse(
+            set(summary['scenarios']) & {'new_post', 'add_comment'}
+        )
+        self.assertEqual(Post.objects.count(), posts)
+        with self.assertRaises(ValueError):
+            loadtest.run(requests=1, concurrency=1, warmup=0,
+                         scenarios=['index', 'new_post'])
+
+    def test_compare_detects_regression(self):
+        """Рост p95 сверх порога считается регрессией."""
+        baseline = {'scenarios': {
+            'index': {'p95_ms': 10.0, 'queries': 2.0, 'errors': 0},
+        }}
+        faster = {'scenarios': {
+            'index': {'p95_ms': 11.0, 'queries': 2.0, 'errors': 0},
+        }}
+        slower = {'scenarios': {
+            'index': {'p95_ms': 15.0, 'queries': 2.0, 'errors': 0},
+        }}
+        self.assertEqual(loadtest.compare(faster, baseline, 0.2), [])
+        self.assertEqual(len(loadtest.compare(slower, baseline, 0.2)), 1)
+
+    def test_percentile(self):
+        """Перцентиль считается методом ближайшего ранга."""
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 0.5), 50)
+        self.assertEqual(loadtest.percentile(values, 0.99), 99)
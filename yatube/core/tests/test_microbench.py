@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core import microbench
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class MicrobenchTests(TestCase):
+    """Тестируются микробенчмарки и сравнение их результатов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create(username='MrSmith')
+        group = Group.objects.create(
+            title='Заголовок тестовой группы',
+            slug='test-group',
+            description='Тестовый текст'
+        )
+        Post.objects.bulk_create(
+            Post(text='Тестовый пост', author=author, group=group)
+            for _ in range(30)
+        )
+
+    def test_all_benchmarks_run(self):
+        """Каждый бенчмарк выполняется или пропускается без данных."""
+        results = microbench.run(repeat=2, number=1, warmup=0)
+        self.assertEqual(set(results), set(microbench.BENCHMARKS))
+        self.assertIsNone(results['render_post_card_100'])
+        self.assertIsNone(results['thumbnail_lookup'])
+        row = results['render_post_card_10']
+        self.assertLessEqual(row['min'], row['median'])
+
+    def test_compare_flags_regression(self):
+        """Рост медианы сверх порога отмечается как регрессия."""
+        previous = {'a': {'median': 1.0}, 'b': {'median': 1.0}}
+        current = {'a': {'median': 1.05}, 'b': {'median': 1.5}}
+        changes = microbench.compare(current, previous, threshold=0.1)
+        self.assertFalse(changes['a']['regression'])
+        self.assertTrue(changes['b']['regression'])
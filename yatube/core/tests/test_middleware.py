@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.query_budget import QueryBudgetExceeded, assert_query_budget
+from posts.models import Post
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    """Тестируется учёт запросов к базе на странице."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_server_timing_header(self):
+        """Ответ содержит время и число запросов к базе."""
+        response = self.client.get(reverse('index'))
+        self.assertRegex(
+            response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries"$'
+        )
+
+    @override_settings(
+        QUERY_BUDGETS={'index': {'queries': 0}},
+        QUERY_BUDGET_ACTION='raise',
+    )
+    def test_budget_violation_raises(self):
+        """Превышение бюджета приводит к исключению."""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('index'))
+
+    @override_settings(
+        QUERY_BUDGETS={'index': {'queries': 0}},
+        QUERY_BUDGET_ACTION='log',
+    )
+    def test_budget_violation_logged(self):
+        """По умолчанию превышение бюджета пишется в лог."""
+        with self.assertLogs('core.query_budget', level='WARNING'):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(
+        QUERY_BUDGETS={'index': {'queries': 100, 'db_time': 0}},
+        QUERY_BUDGET_ACTION='log',
+    )
+    def test_assert_query_budget_ignores_time(self):
+        """В тестах по умолчанию проверяется только число запросов."""
+        with assert_query_budget('index'):
+            Post.objects.count()
+        with self.assertRaises(QueryBudgetExceeded):
+            with assert_query_budget('index', db_time=True):
+                Post.objects.count()
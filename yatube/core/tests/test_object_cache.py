@@ -0,0 +1,138 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.http import Http404
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.object_cache import get_cached, get_cached_or_404
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ObjectCacheTests(TestCase):
+    """Тестируется кеш записей для поиска по ключу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.author = User.objects.create(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_lookup_skips_database(self):
+        """Повторный поиск по ключу и по уникальному полю идёт без базы."""
+        lookups = (
+            (Group, {'slug': 'group'}),
+            (User, {'username': 'author'}),
+            (Post, {'pk': self.post.pk}),
+        )
+        for model, lookup in lookups:
+            with self.subTest(model=model.__name__):
+                first = get_cached(model, **lookup)
+                with self.assertNumQueries(0):
+                    self.assertEqual(get_cached(model, **lookup), first)
+        with self.assertNumQueries(0):
+            self.assertEqual(Group.objects.get_cached(pk=self.group.pk),
+                             self.group)
+
+    def test_miss_is_cached(self):
+        """Отсутствие записи кешируется и даёт 404."""
+        with self.assertRaises(Group.DoesNotExist):
+            Group.objects.get_cached(slug='missing')
+        with self.assertNumQueries(0):
+            with self.assertRaises(Http404):
+                get_cached_or_404(Group, slug='missing')
+
+    def test_created_record_replaces_cached_miss(self):
+        """Новая запись находится, даже если её отсутствие закешировано."""
+        with self.assertRaises(User.DoesNotExist):
+            get_cached(User, username='newcomer')
+        user = User.objects.create(username='newcomer')
+        self.assertEqual(get_cached(User, username='newcomer'), user)
+
+    def test_save_and_rename(self):
+        """Сохранение сбрасывает запись, старое имя больше не находится."""
+        get_cached(Group, slug='group')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.slug = 'renamed'
+        group.save()
+        self.assertEqual(get_cached(Group, pk=group.pk).title,
+                         'Новое название')
+        self.assertEqual(get_cached(Group, slug='renamed'), group)
+        with self.assertRaises(Group.DoesNotExist):
+            get_cached(Group, slug='group')
+
+    def test_stale_read_is_not_stored(self):
+        """Строка, прочитанная до изменения записи, не попадает в кеш."""
+        first = QuerySet.first
+        pending = [True]
+
+        def read_then_write(queryset):
+            row = first(queryset)
+            if pending:
+                pending.clear()
+                group = Group.objects.get(pk=self.group.pk)
+                group.title = 'Новое название'
+                group.save()
+            return row
+
+        with mock.patch.object(QuerySet, 'first', read_then_write):
+            self.assertEqual(get_cached(Group, pk=self.group.pk).title,
+                             'Группа')
+        self.assertEqual(get_cached(Group, pk=self.group.pk).title,
+                         'Новое название')
+
+    def test_delete(self):
+        """Удалённая запись не находится."""
+        get_cached(Post, pk=self.post.pk)
+        Post.objects.filter(pk=self.post.pk).delete()
+        with self.assertRaises(Post.DoesNotExist):
+            get_cached(Post, pk=self.post.pk)
+
+    def test_counters_are_fresh(self):
+        """Счётчики, обновлённые без сигналов, не устаревают в кеше."""
+        get_cached(Post, pk=self.post.pk)
+        get_cached(Group, slug='group')
+        Comment.objects.create(post=self.post, author=self.author, text='Да')
+        Post.objects.create(text='Ещё', author=self.author, group=self.group)
+        self.assertEqual(get_cached(Post, pk=self.post.pk).comments_count, 1)
+        self.assertEqual(get_cached(Group, slug='group').posts_count, 2)
+
+    def test_user_credentials_are_not_cached(self):
+        """Пароль и почта пользователя не попадают в кеш."""
+        user = User.objects.create_user('leo', 'leo@example.com', 'secret')
+        # Сразу после сохранения запись не кешируется: убираем надгробие.
+        cache.clear()
+        get_cached(User, username='leo')
+        cached = cache.get(f'object:auth.user:{user.pk}')
+        self.assertEqual(cached.username, 'leo')
+        self.assertNotIn('password', cached.__dict__)
+        self.assertNotIn('email', cached.__dict__)
+
+    def test_only_unique_lookups(self):
+        """Поиск только по одному уникальному полю."""
+        with self.assertRaises(ValueError):
+            get_cached(Group, title='Группа')
+        with self.assertRaises(ValueError):
+            get_cached(Group, pk=1, slug='group')
+
+    def test_post_view_checks_author(self):
+        """Пост под чужим именем в адресе не показывается."""
+        other = User.objects.create(username='other')
+        client = Client()
+        client.force_login(other)
+        url = reverse('post_view', args=[other.username, self.post.pk])
+        self.assertEqual(client.get(url).status_code, 404)
+        url = reverse('post_view', args=[self.author.username, self.post.pk])
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.group.title)
@@ -0,0 +1,168 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.page_cache import (hit_ratio, page_cache_metrics,
+                             reset_page_cache_metrics)
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class PageCacheMiddlewareTests(TestCase):
+    """Тестируется кеш готовых страниц для анонимных читателей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Заголовок тестовой группы',
+            slug='test-group',
+            description='Тестовый текст'
+        )
+        cls.author = User.objects.create(username='MrSmith')
+        cls.reader = User.objects.create(username='MrAnon')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        reset_page_cache_metrics()
+        self.client = Client()
+        self.urls = {
+            'index': reverse('index'),
+            'group': reverse('group', args=[self.group.slug]),
+            'profile': reverse('profile', args=[self.author.username]),
+            'post_view': reverse(
+                'post_view', args=[self.author.username, self.post.id]
+            ),
+        }
+
+    def assertCacheStatus(self, url, status):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Page-Cache'], status)
+        return response
+
+    def test_second_request_is_served_from_cache(self):
+        """Повторный анонимный запрос отдаётся из кеша без запросов к базе."""
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                first = self.assertCacheStatus(url, 'miss')
+                with self.assertNumQueries(0):
+                    second = self.assertCacheStatus(url, 'hit')
+                self.assertEqual(first.content, second.content)
+
+    def test_query_string_is_part_of_key(self):
+        """Разные строки запроса кешируются отдельно."""
+        self.assertCacheStatus(self.urls['index'], 'miss')
+        self.assertCacheStatus(self.urls['index'] + '?page=2', 'miss')
+        self.assertCacheStatus(self.urls['index'] + '?page=2', 'hit')
+
+    def test_other_query_params_bypass_cache(self):
+        """Посторонние параметры не создают записей в кеше."""
+        url = self.urls['index']
+        self.assertCacheStatus(url, 'miss')
+        for query in ('?x=1', '?page=2&x=1', '?page=1&page=2'):
+            with self.subTest(query=query):
+                self.assertCacheStatus(url + query, 'bypass')
+                self.assertCacheStatus(url + query, 'bypass')
+        self.assertCacheStatus(url + '?page=2', 'miss')
+        self.assertCacheStatus(url, 'hit')
+
+    def test_logged_in_user_bypasses_cache(self):
+        """Вошедший пользователь всегда получает свою страницу."""
+        self.assertCacheStatus(self.urls['index'], 'miss')
+        self.client.force_login(self.reader)
+        response = self.assertCacheStatus(self.urls['index'], 'bypass')
+        self.assertContains(response, self.reader.username)
+
+    def test_other_views_are_not_cached(self):
+        """Страницы не из PAGE_CACHE_VIEWS не кешируются."""
+        response = self.client.get(reverse('about:author'))
+        self.assertNotIn('X-Page-Cache', response)
+
+    def test_new_post_invalidates_pages(self):
+        """Новый пост сбрасывает страницы с постами и счётчиками автора."""
+        other_profile = reverse('profile', args=[self.reader.username])
+        for url in list(self.urls.values()) + [other_profile]:
+            self.client.get(url)
+        Post.objects.create(text='Новый пост', author=self.author,
+                            group=self.group)
+        for name in ('index', 'group', 'profile'):
+            with self.subTest(page=name):
+                response = self.assertCacheStatus(self.urls[name], 'stale')
+                self.assertContains(response, 'Новый пост')
+        self.assertCacheStatus(self.urls['post_view'], 'stale')
+        self.assertCacheStatus(other_profile, 'hit')
+
+    def test_comment_invalidates_post_page(self):
+        """Комментарий сбрасывает страницу поста."""
+        self.client.get(self.urls['post_view'])
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Новый комментарий')
+        response = self.assertCacheStatus(self.urls['post_view'], 'stale')
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_follow_invalidates_profiles(self):
+        """Подписка сбрасывает профили автора и подписчика."""
+        self.client.get(self.urls['profile'])
+        self.client.get(self.urls['index'])
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertCacheStatus(self.urls['profile'], 'stale')
+        self.assertCacheStatus(self.urls['index'], 'hit')
+
+    def test_group_change_invalidates_all_pages(self):
+        """Переименование группы сбрасывает все страницы."""
+        for url in self.urls.values():
+            self.client.get(url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                self.assertCacheStatus(url, 'stale')
+
+    def test_metrics(self):
+        """Считаются попадания, промахи и доля попаданий."""
+        for _ in range(4):
+            self.client.get(self.urls['index'])
+        events = page_cache_metrics()['index']
+        self.assertEqual(events['hit'], 3)
+        self.assertEqual(events['miss'], 1)
+        self.assertEqual(hit_ratio(events), 0.75)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class PageCachePlaceholderTests(TestCase):
+    """Страница с заглушкой вместо миниатюры не кешируется."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_page_with_placeholder_is_not_stored(self):
+        cache.clear()
+        output = BytesIO()
+        Image.new('RGB', (1000, 400), (1, 2, 3)).save(output, 'JPEG')
+        Post.objects.create(
+            text='Пост', author=User.objects.create(username='MrSmith'),
+            image=SimpleUploadedFile('photo.jpg', output.getvalue(),
+                                     'image/jpeg'),
+        )
+        client = Client()
+        with mock.patch('posts.thumbnails.schedule'):
+            for _ in range(2):
+                response = client.get(reverse('index'))
+                self.assertContains(response, 'data-pending-image')
+                self.assertEqual(response['X-Page-Cache'], 'miss')
@@ -0,0 +1,120 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.staticfiles import brotli
+from core.views import accepted_encodings
+
+SOURCE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CSS = b'body { color: #333; }\n' * 50
+
+
+@override_settings(
+    STATIC_ROOT=STATIC_ROOT,
+    STATICFILES_DIRS=[SOURCE_DIR],
+    STATICFILES_STORAGE=(
+        'core.staticfiles.CompressedManifestStaticFilesStorage'
+    ),
+)
+class StaticPipelineTests(TestCase):
+    """Тестируется сборка и отдача статики."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(SOURCE_DIR, 'css'), exist_ok=True)
+        with open(os.path.join(SOURCE_DIR, 'css', 'app.css'), 'wb') as file:
+            file.write(CSS)
+        with open(os.path.join(SOURCE_DIR, 'tiny.js'), 'wb') as file:
+            file.write(b'1;')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(SOURCE_DIR, ignore_errors=True)
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        call_command('collectstatic', interactive=False, verbosity=0,
+                     ignore_patterns=['admin', 'debug_toolbar'])
+        self.client = Client()
+        self.hashed = staticfiles_storage.stored_name('css/app.css')
+
+    def static_url(self, path):
+        return reverse('static', kwargs={'path': path})
+
+    def test_hashed_names_and_compressed_copies(self):
+        """Файлы получают хеш в имени и сжатые копии рядом."""
+        self.assertRegex(self.hashed, r'^css/app\.[0-9a-f]{12}\.css$')
+        path = os.path.join(STATIC_ROOT, self.hashed)
+        with open(path + '.gz', 'rb') as file:
+            self.assertEqual(gzip.decompress(file.read()), CSS)
+        self.assertEqual(os.path.exists(path + '.br'), brotli is not None)
+        self.assertFalse(os.path.exists(
+            os.path.join(STATIC_ROOT, 'tiny.js.gz')
+        ))
+        self.assertTrue(os.path.exists(
+            os.path.join(STATIC_ROOT, 'staticfiles.json')
+        ))
+
+    def test_template_links_hashed_name(self):
+        """Тег `static` ссылается на файл с хешем в имени."""
+        html = Template(
+            "{% load static %}{% static 'css/app.css' %}"
+        ).render(Context())
+        self.assertEqual(html, settings.STATIC_URL + self.hashed)
+
+    def test_missing_manifest_entry_keeps_name(self):
+        """Файл не из манифеста подключается под исходным именем."""
+        self.assertEqual(staticfiles_storage.url('missing.css'),
+                         settings.STATIC_URL + 'missing.css')
+
+    def test_serves_gzip_with_immutable_cache(self):
+        """Файл с хешем отдаётся сжатым и кешируется навсегда."""
+        response = self.client.get(self.static_url(self.hashed),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), CSS)
+
+    def test_serves_identity_without_accept_encoding(self):
+        """Без Accept-Encoding отдаётся исходный файл."""
+        response = self.client.get(self.static_url(self.hashed),
+                                   HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), CSS)
+
+    def test_unhashed_name_has_short_cache(self):
+        """Файл без хеша в имени кешируется ненадолго."""
+        response = self.client.get(self.static_url('css/app.css'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={settings.STATIC_CACHE_MAX_AGE}',
+                      response['Cache-Control'])
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304."""
+        etag = self.client.get(self.static_url(self.hashed),
+                               HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.client.get(self.static_url(self.hashed),
+                                   HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_accepted_encodings(self):
+        """Разбирается Accept-Encoding с весами."""
+        self.assertEqual(accepted_encodings('gzip, br;q=0, deflate;q=0.5'),
+                         {'gzip', 'deflate'})
@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.views import RangeNotSatisfiable, parse_range
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = bytes(range(256)) * 4
+
+
+class ParseRangeTests(TestCase):
+    """Тестируется разбор заголовка Range."""
+
+    def test_ranges(self):
+        """Поддерживаются обычный, открытый и суффиксный диапазоны."""
+        cases = {
+            'bytes=0-9': (0, 9),
+            'bytes=10-': (10, 99),
+            'bytes=-10': (90, 99),
+            'bytes=90-500': (90, 99),
+            'bytes=-500': (0, 99),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 100), expected)
+
+    def test_ignored_ranges(self):
+        """Несколько диапазонов и неверный синтаксис игнорируются."""
+        for header in ('bytes=0-1,5-6', 'items=0-1', 'bytes=5-1', 'bytes=-'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 100))
+
+    def test_unsatisfiable(self):
+        """Диапазон за концом файла недостижим."""
+        for header in ('bytes=100-', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(RangeNotSatisfiable):
+                    parse_range(header, 100)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_SENDFILE=None)
+class ServeMediaTests(TestCase):
+    """Тестируется отдача файлов из MEDIA_ROOT."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts'), exist_ok=True)
+        with open(os.path.join(MEDIA_ROOT, 'posts', 'a.jpg'), 'wb') as file:
+            file.write(CONTENT)
+        with open(os.path.join(MEDIA_ROOT, 'posts', '.upload-1'), 'wb'):
+            pass
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('media', kwargs={'path': 'posts/a.jpg'})
+
+    def test_serves_file_with_cache_headers(self):
+        """Файл отдаётся целиком с заголовками кеширования."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_cache_headers(self):
+        """Навсегда кешируются только картинки с хешем и миниатюры."""
+        digest = 'ab' * 32
+        names = {
+            f'posts/ab/ab/{digest}.jpg': True,
+            'cache/12/34/thumbnail.jpg': True,
+            'posts/a.jpg': False,
+            'posts/bench-1.jpg': False,
+        }
+        for name, immutable in names.items():
+            with self.subTest(name=name):
+                full_path = os.path.join(MEDIA_ROOT, name)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                with open(full_path, 'wb') as file:
+                    file.write(CONTENT)
+                response = self.client.get(
+                    reverse('media', kwargs={'path': name})
+                )
+                cache_control = response['Cache-Control']
+                self.assertIn('public', cache_control)
+                self.assertEqual('immutable' in cache_control, immutable)
+                self.assertEqual('no-cache' in cache_control, not immutable)
+
+    def test_not_modified(self):
+        """Запрос с совпадающим ETag получает 304 без тела."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_range(self):
+        """Диапазон из Range отдаётся с кодом 206."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content),
+                         CONTENT[10:20])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_range_not_satisfiable(self):
+        """Диапазон за концом файла получает 416."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_stale_if_range_serves_whole_file(self):
+        """При устаревшем If-Range отдаётся весь файл."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    def test_hidden_and_missing_files(self):
+        """Скрытые, отсутствующие и внешние файлы не отдаются."""
+        for path in ('posts/.upload-1', 'posts/b.jpg', '../settings.py',
+                     'posts'):
+            with self.subTest(path=path):
+                response = self.client.get(
+                    reverse('media', kwargs={'path': path})
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_post_not_allowed(self):
+        """Файлы можно только читать."""
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        """Для nginx тело не отдаётся, а передаётся внутренний путь."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/posts/a.jpg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('ETag', response)
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        """Для X-Sendfile передаётся путь к файлу на диске."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Sendfile'],
+                         os.path.join(MEDIA_ROOT, 'posts', 'a.jpg'))
@@ -0,0 +1,261 @@
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# Сжатые копии статики в порядке предпочтения.
+STATIC_ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Диапазон `(start, end)` включительно из заголовка Range.
+
+    Поддерживается один диапазон; несколько диапазонов и неверный
+    синтаксис игнорируются (`None` — отдаётся весь файл), для диапазона
+    за концом файла бросается `RangeNotSatisfiable`.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if not length or not size:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def check_access(request, path):
+    """
+    Проверки доступа к файлу перед отдачей. Картинки постов публичны,
+    поэтому закрыты только скрытые файлы: например, недописанные
+    загрузки `.upload-*` хранилища картинок.
+    """
+    if any(part.startswith('.') for part in path.split('/')):
+        raise Http404
+
+
+def _resolve(root, path):
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(root, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404
+    return path, full_path, stat_result
+
+
+def _validators(stat_result):
+    """Размер, время изменения и ETag в формате nginx."""
+    size = stat_result.st_size
+    last_modified = int(stat_result.st_mtime)
+    return size, last_modified, f'"{last_modified:x}-{size:x}"'
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _read_range(full_path, start, length):
+    with open(full_path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def is_immutable_media(path):
+    """Файл из MEDIA_ROOT, который никогда не перезаписывается."""
+    return any(re.match(pattern, path)
+               for pattern in settings.MEDIA_IMMUTABLE_PATTERNS)
+
+
+def _offload_response(path, full_path):
+    """Пустой ответ, файл за которым отправит фронтовой сервер."""
+    response = HttpResponse()
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_PREFIX + path
+        )
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def _file_response(request, full_path, size, etag, last_modified):
+    """Ответ с телом файла, целиком или диапазоном из Range."""
+    response = None
+    header = request.META.get('HTTP_RANGE')
+    if header and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(full_path, start, end - start + 1), status=206
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+    if response is None:
+        response = FileResponse(open(full_path, 'rb'))
+        response['Content-Length'] = size
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Отдаёт файл из MEDIA_ROOT после проверки доступа.
+
+    Если задан MEDIA_SENDFILE, тело не читается: в ответе только
+    заголовок `X-Accel-Redirect` или `X-Sendfile`, и файл вместе
+    с диапазонами Range отправляет фронтовой сервер, а процесс Django
+    сразу освобождается. Иначе файл отдаётся по частям самим Django.
+    Условные запросы по `ETag` и `Last-Modified` обрабатываются здесь
+    в обоих случаях.
+
+    Навсегда кешируются только файлы из MEDIA_IMMUTABLE_PATTERNS,
+    остальные браузер перепроверяет при каждом показе.
+    """
+    check_access(request, path)
+    path, full_path, stat_result = _resolve(settings.MEDIA_ROOT, path)
+    size, last_modified, etag = _validators(stat_result)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            response = _offload_response(path, full_path)
+        else:
+            response = _file_response(request, full_path, size, etag,
+                                      last_modified)
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response['Content-Type'] = (content_type
+                                    or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if is_immutable_media(path):
+        patch_cache_control(response, public=True,
+                            max_age=settings.MEDIA_CACHE_MAX_AGE,
+                            immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, которые клиент не запретил `q=0`."""
+    encodings = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+def _compressed_variant(request, full_path):
+    """Сжатая копия файла, которую примет клиент, и её кодировка."""
+    accepted = accepted_encodings(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    for extension, encoding in STATIC_ENCODINGS:
+        if encoding in accepted or '*' in accepted:
+            try:
+                stat_result = os.stat(full_path + extension)
+            except OSError:
+                continue
+            return full_path + extension, stat_result, encoding
+    return None
+
+
+@require_safe
+def serve_static(request, path):
+    """
+    Отдаёт файл из STATIC_ROOT, собранный `collectstatic`.
+
+    Если клиент принимает brotli или gzip и рядом лежит сжатая копия,
+    отдаётся она. Файлы с хешем содержимого в имени кешируются навсегда,
+    остальные — на STATIC_CACHE_MAX_AGE секунд. В разработке статику
+    раньше перехватывает `runserver`.
+    """
+    path, full_path, stat_result = _resolve(settings.STATIC_ROOT, path)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    variant = None
+    if encoding is None:
+        variant = _compressed_variant(request, full_path)
+    if variant is not None:
+        full_path, stat_result, encoding = variant
+    size, last_modified, etag = _validators(stat_result)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = _file_response(request, full_path, size, etag,
+                                  last_modified)
+        response['Content-Type'] = (content_type
+                                    or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if getattr(staticfiles_storage, 'is_hashed', None) and (
+        staticfiles_storage.is_hashed(path)
+    ):
+        patch_cache_control(response, public=True,
+                            max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True,
+                            max_age=settings.STATIC_CACHE_MAX_AGE)
+    return response
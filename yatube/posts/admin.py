@@ -6,6 +6,7 @@ from .models import Group, Post, Comment, Follow
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ("pk", "text", "pub_date", "author")
+    list_select_related = ("author",)
     search_fields = ("text",)
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
@@ -22,6 +23,7 @@ class GroupAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ("pk", "text", "created", "author", "post")
+    list_select_related = ("author", "post")
     search_fields = ("post",)
     list_filter = ("created",)
     empty_value_display = "-пусто-"
@@ -30,6 +32,7 @@ class CommentAdmin(admin.ModelAdmin):
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ("pk", "user", "author")
+    list_select_related = ("user", "author")
     search_fields = ("author",)
     list_filter = ("author",)
     empty_value_display = "-пусто-"
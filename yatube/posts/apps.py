@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa
+        # Кеш сбрасывается после обработчиков, обновляющих счётчики.
+        from . import dependencies  # noqa
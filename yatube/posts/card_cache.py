@@ -0,0 +1,82 @@
+"""
+Кеш отрендеренных карточек постов.
+
+Карточка одинакова для всех читателей, кроме ссылки «Редактировать»
+для автора, поэтому она рендерится без пользователя и кешируется
+целиком, а на месте ссылки остаётся метка `ACTIONS_MARKER`; ссылка
+подставляется при выводе. Ключ включает хеш всего, что показано
+в карточке: текста, картинки, числа комментариев, имени автора,
+названия и адреса группы. Правка поста, новый комментарий или
+переименование автора и группы дают новый ключ, так что сбрасывать
+кеш не нужно, а старые карточки вытесняются по сроку.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+
+CARD_TEMPLATE = 'includes/post_card.html'
+ACTIONS_TEMPLATE = 'includes/post_card_actions.html'
+ACTIONS_MARKER = mark_safe('<!-- post-card-actions -->')
+# Увеличивается при изменении шаблона карточки.
+TEMPLATE_VERSION = 1
+
+
+def card_key(post):
+    group = post.group
+    parts = (
+        post.text, post.image.name or '', post.image_width,
+        post.image_height, post.comments_count, post.pub_date.isoformat(),
+        str(post.author), post.author.username,
+        group and (group.slug, group.title),
+    )
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'post_card:{TEMPLATE_VERSION}:{post.pk}:{digest}'
+
+
+def _is_final(post):
+    # Карточка с заглушкой вместо картинки не кешируется: миниатюра
+    # скоро будет готова.
+    return not post.image or post.prefetched_card_image is not None
+
+
+def prefetch_cards(posts):
+    """
+    Находит карточки постов одним `get_many`, рендерит недостающие
+    и сохраняет их одним `set_many`. Картинки ищутся только для
+    недостающих карточек. Результат — в `post.cached_card`.
+    """
+    posts = list(posts)
+    keys = {post.pk: card_key(post) for post in posts}
+    cached = cache.get_many(list(keys.values()))
+    missing = [post for post in posts if keys[post.pk] not in cached]
+    if missing:
+        thumbnails.prefetch_card_images(missing)
+        fresh = {}
+        for post in missing:
+            key = keys[post.pk]
+            cached[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'card_actions': ACTIONS_MARKER}
+            )
+            if _is_final(post):
+                fresh[key] = cached[key]
+        cache.set_many(fresh, timeout=settings.POST_CARD_CACHE_TIMEOUT)
+    for post in posts:
+        post.cached_card = cached[keys[post.pk]]
+
+
+def render_card(post, user=None):
+    """Карточка поста со ссылками, которые видит пользователь `user`."""
+    if not hasattr(post, 'cached_card'):
+        prefetch_cards([post])
+    actions = ''
+    if user is not None and user.is_authenticated and (
+        user.pk == post.author_id
+    ):
+        actions = render_to_string(ACTIONS_TEMPLATE,
+                                   {'post': post, 'user': user})
+    return mark_safe(post.cached_card.replace(ACTIONS_MARKER, actions))
@@ -0,0 +1,127 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from core import dependencies, object_cache
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _count(queryset, field):
+    """Подзапрос `COUNT(*)` по строкам `queryset`, связанным с `OuterRef`."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def _shifted(field, delta):
+    # Счётчик мог разойтись с данными (bulk_create, loaddata, update)
+    # и уже быть нулём: уменьшение не уходит ниже нуля и не нарушает
+    # ограничение PositiveIntegerField.
+    return Greatest(F(field) + delta, 0)
+
+
+def user_stats_values():
+    return {
+        'posts_count': _count(Post.objects.all(), 'author'),
+        'followers_count': _count(Follow.objects.all(), 'author'),
+        'following_count': _count(Follow.objects.all(), 'user'),
+    }
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики одного пользователя, создавая их при нужде."""
+    values = User.objects.filter(pk=user_id).annotate(
+        **user_stats_values()
+    ).values(*user_stats_values()).first()
+    if values is None:
+        return None
+    try:
+        with transaction.atomic():
+            stats, _ = UserStats.objects.update_or_create(
+                user_id=user_id, defaults=values
+            )
+    except IntegrityError:
+        stats = UserStats.objects.get(user_id=user_id)
+    return stats
+
+
+def get_user_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def bump_user(user_id, field, delta):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{field: _shifted(field, delta)}
+    )
+    if not updated and delta > 0:
+        # Счётчиков ещё нет: считаем их целиком, включая текущую запись.
+        recount_user(user_id)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=_shifted('posts_count', delta)
+        )
+        object_cache.forget(Group, group_id)
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shifted('comments_count', delta)
+    )
+    object_cache.forget(Post, post_id)
+
+
+def _chunks(queryset, chunk_size):
+    """Первичные ключи `queryset` порциями по `chunk_size` строк."""
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        chunk = pks if last is None else pks.filter(pk__gt=last)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def reconcile(chunk_size=1000):
+    """
+    Пересчитывает все счётчики порциями по `chunk_size` строк.
+    Возвращает число обработанных строк по каждой модели.
+
+    Счётчики меняются через `update()` без сигналов, поэтому записи
+    сбрасываются из кеша записей, а закешированные страницы — целиком.
+    """
+    processed = {'users': 0, 'posts': 0, 'groups': 0}
+    for pks in _chunks(User.objects.all(), chunk_size):
+        with transaction.atomic():
+            missing = User.objects.filter(
+                pk__range=(pks[0], pks[-1]), stats__isnull=True
+            ).values_list('pk', flat=True)
+            UserStats.objects.bulk_create(
+                UserStats(user_id=pk) for pk in missing
+            )
+            # Первичный ключ `UserStats` совпадает с `User.pk`.
+            processed['users'] += UserStats.objects.filter(
+                user__pk__range=(pks[0], pks[-1])
+            ).update(**user_stats_values())
+    for pks in _chunks(Post.objects.all(), chunk_size):
+        processed['posts'] += Post.objects.filter(
+            pk__range=(pks[0], pks[-1])
+        ).update(comments_count=_count(Comment.objects.all(), 'post'))
+        object_cache.forget(Post, *pks)
+    for pks in _chunks(Group.objects.all(), chunk_size):
+        processed['groups'] += Group.objects.filter(
+            pk__range=(pks[0], pks[-1])
+        ).update(posts_count=_count(Post.objects.all(), 'group'))
+        object_cache.forget(Group, *pks)
+    dependencies.invalidate(dependencies.ALL)
+    return processed
@@ -0,0 +1,68 @@
+"""
+От каких записей зависят закешированные страницы постов.
+
+Теги страниц заданы в settings.PAGE_CACHE_VIEWS; тег `index` общий
+для страницы главной и кеша её записей в `feed_cache`. Счётчики
+постов и подписок в шапке профиля и поста относятся к тегу автора.
+На карточках показаны имя автора, название группы и число комментариев,
+поэтому страницы со списками зависят и от них.
+"""
+from django.db.models import F
+
+from core.dependencies import depends_on
+
+from .models import Comment, Follow, Group, Post, User
+
+GROUP_FIELDS = ('title', 'slug', 'description')
+USER_FIELDS = ('username',)
+
+
+def one(**params):
+    return [params]
+
+
+# Главная: лента всех постов.
+depends_on('index', Post)
+depends_on('index', Comment)
+depends_on('index', Group, fields=GROUP_FIELDS)
+depends_on('index', User, fields=USER_FIELDS)
+
+# Страница группы: описание группы и её посты.
+depends_on('group:{slug}', Post, lambda post: Group.objects.filter(
+    pk=post.group_id
+).values('slug'))
+depends_on('group:{slug}', Comment, lambda comment: Group.objects.filter(
+    group__pk=comment.post_id
+).values('slug'))
+depends_on('group:{slug}', Group, lambda group: one(slug=group.slug),
+           fields=GROUP_FIELDS)
+depends_on('group:{slug}', User, lambda user: Group.objects.filter(
+    group__author=user
+).values('slug').distinct(), fields=USER_FIELDS)
+
+# Профиль и шапка страницы поста: автор, его посты и счётчики.
+depends_on('user:{username}', Post, lambda post: User.objects.filter(
+    pk=post.author_id
+).values('username'))
+depends_on('user:{username}', Comment, lambda comment: User.objects.filter(
+    posts__pk=comment.post_id
+).values('username'))
+depends_on('user:{username}', Follow, lambda follow: User.objects.filter(
+    pk__in=(follow.author_id, follow.user_id)
+).values('username'))
+depends_on('user:{username}', User, lambda user: one(username=user.username),
+           fields=USER_FIELDS)
+depends_on('user:{username}', Group, lambda group: User.objects.filter(
+    posts__group=group
+).values('username').distinct(), fields=GROUP_FIELDS)
+
+# Страница поста: пост и комментарии к нему.
+depends_on('post:{post_id}', Post, lambda post: one(post_id=post.pk))
+depends_on('post:{post_id}', Comment,
+           lambda comment: one(post_id=comment.post_id))
+depends_on('post:{post_id}', Group, lambda group: Post.objects.filter(
+    group=group
+).values(post_id=F('pk')), fields=GROUP_FIELDS)
+depends_on('post:{post_id}', User, lambda user: Comment.objects.filter(
+    author=user
+).values('post_id').distinct(), fields=USER_FIELDS)
@@ -0,0 +1,82 @@
+from django.conf import settings
+
+from core import dependencies
+from core.caching import get_or_compute
+
+from .models import PUBLIC_USER_FIELDS, Post
+
+TAGS = ('index',)
+
+
+def index_posts():
+    """
+    Посты главной для кеша. У авторов загружаются только показываемые
+    поля, поэтому пароль и почта не попадают в кеш вместе с постами.
+    """
+    post_fields = [field.name for field in Post._meta.concrete_fields]
+    return Post.objects.select_related('author', 'group').only(
+        *post_fields, *(f'author__{name}' for name in PUBLIC_USER_FIELDS)
+    )
+
+
+def page_key(number):
+    return f'index_page:{dependencies.stamp(TAGS)}:{number}'
+
+
+def _numbered_page(paginator, number):
+    """
+    Страница `number` главной, выбранная по смещению, и курсоры, которыми
+    на неё ссылаются соседние страницы: `?after=` с предыдущей
+    и `?before=` со следующей.
+    """
+    per_page = paginator.per_page
+    offset = (number - 1) * per_page
+    start = max(offset - 1, 0)
+    rows = list(paginator.object_list[start:offset + per_page + 1])
+    boundary = rows.pop(0) if offset and rows else None
+    after = before = None
+    if boundary is not None:
+        after = paginator.encode_cursor(boundary, number - 1)
+    if len(rows) > per_page:
+        before = paginator.encode_cursor(rows[per_page], number + 1)
+    return rows[:per_page], len(rows) > per_page, after, before
+
+
+def _requested(params, number, rows, after, before):
+    """Ведут ли параметры запроса ровно на закешированную страницу."""
+    if not rows and number > 1:
+        return False
+    if params.get('after'):
+        return params['after'] == after
+    if params.get('before'):
+        return params['before'] == before
+    if params.get('page'):
+        return params['page'] == str(number)
+    return number == 1
+
+
+def get_index_page(request, paginator):
+    """
+    Страница главной из кеша или из базы.
+
+    Кешируются только записи первых INDEX_CACHE_PAGES страниц и их
+    положение в ленте, а не вся выборка. Ключ включает версию тега
+    `index`, которую сбрасывают изменения постов, комментариев, групп
+    и авторов, поэтому новая запись видна сразу.
+
+    Ключ строится по номеру страницы, а не по параметрам запроса, поэтому
+    число записей в кеше ограничено. Вместе со страницей хранятся курсоры,
+    которые на неё ведут; запрос с другим курсором (устаревшим,
+    поддельным или некорректным) выполняется без кеша.
+    Одновременные промахи по одному ключу пересчитываются один раз.
+    """
+    number = paginator.requested_number(request.GET)
+    if number > settings.INDEX_CACHE_PAGES:
+        return paginator.get_cursor_page(request.GET)
+    rows, has_more, after, before = get_or_compute(
+        page_key(number), lambda: _numbered_page(paginator, number),
+        timeout=settings.INDEX_CACHE_TIMEOUT,
+    )
+    if not _requested(request.GET, number, rows, after, before):
+        return paginator.get_cursor_page(request.GET)
+    return paginator.restore_page(rows, number, has_more)
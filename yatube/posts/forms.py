@@ -1,5 +1,8 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
 
+from .imaging import ImageTooLarge, prepare_upload
 from .models import Post, Comment
 
 
@@ -10,6 +13,36 @@ class PostForm(forms.ModelForm):
         verbose_name_plural = 'Сообщения'
         fields = ['text', 'group', 'image']
 
+    def clean_image(self):
+        """
+        Уменьшает загруженную картинку до IMAGE_MAX_EDGE, поворачивает
+        по EXIF и удаляет метаданные, чтобы дальше её не приходилось
+        перечитывать. Результат пишется во временный файл на диске.
+        """
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        image.seek(0)
+        output = TemporaryUploadedFile(image.name, image.content_type, 0,
+                                       image.charset)
+        try:
+            changed = prepare_upload(image, output, settings.IMAGE_MAX_EDGE,
+                                     settings.IMAGE_MAX_PIXELS)
+        except ImageTooLarge:
+            output.close()
+            raise forms.ValidationError(
+                'Картинка слишком большая: не больше %(limit)s мегапикселей.',
+                code='image_too_large',
+                params={'limit': settings.IMAGE_MAX_PIXELS // 10 ** 6},
+            )
+        image.seek(0)
+        if not changed:
+            output.close()
+            return image
+        output.size = output.tell()
+        output.seek(0)
+        return output
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
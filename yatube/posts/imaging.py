@@ -0,0 +1,145 @@
+"""
+Обработка картинок в процессах пула миниатюр и при загрузке.
+
+Модуль намеренно не импортирует Django: функции выполняются в дочерних
+процессах, которые не настраивают проект, и работают только с Pillow.
+"""
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Форматы, которые при загрузке уменьшаются и очищаются от метаданных.
+# Остальные (например, анимированный GIF) сохраняются как есть.
+NORMALIZED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+ORIENTATION = 0x0112
+
+
+def write_atomic(path, data, mode=0o644):
+    """Записывает файл целиком: читатели не увидят его недописанным."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            output.write(data)
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class ImageTooLarge(ValueError):
+    """Картинку не получится декодировать в пределах лимита пикселей."""
+
+
+def _draft_size(size, max_edge):
+    scale = max_edge / max(size)
+    return tuple(max(1, int(side * scale)) for side in size)
+
+
+def prepare_upload(source, output, max_edge, max_pixels):
+    """
+    Уменьшает картинку так, чтобы длинная сторона была не больше
+    `max_edge`, поворачивает её по EXIF и удаляет EXIF и XMP.
+
+    Размеры проверяются по заголовку до декодирования. JPEG сразу
+    декодируется в уменьшенном масштабе (`draft`), остальные форматы —
+    целиком, поэтому если декодировать пришлось бы больше `max_pixels`
+    пикселей, бросается `ImageTooLarge`. Результат в исходном формате
+    пишется в файл `output`; если менять нечего, возвращает `False`
+    и `output` не трогает. Цветовой профиль сохраняется; JPEG без
+    изменений пикселей пересохраняется с исходными таблицами квантования.
+    """
+    with Image.open(source) as image:
+        format = image.format
+        resized = max(image.size) > max_edge
+        if resized and format == 'JPEG':
+            image.draft(None, _draft_size(image.size, max_edge))
+        if image.width * image.height > max_pixels:
+            raise ImageTooLarge(image.size)
+        if format not in NORMALIZED_FORMATS:
+            return False
+        exif = image.getexif()
+        xmp = {'xmp', 'XML:com.adobe.xmp'} & set(image.info)
+        if not resized and not exif and not xmp:
+            return False
+        rotated = exif.get(ORIENTATION, 1) != 1
+        params = {}
+        if image.info.get('icc_profile'):
+            params['icc_profile'] = image.info['icc_profile']
+        if format == 'JPEG':
+            params['quality'] = 95 if rotated or resized else 'keep'
+            if not rotated and not resized:
+                params['subsampling'] = 'keep'
+        if resized:
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        image = ImageOps.exif_transpose(image) if rotated else image
+        image.save(output, format, **params)
+    return True
+
+
+def image_size(file):
+    """
+    Ширина и высота картинки по её заголовку или `(None, None)`, если
+    это не картинка. Позиция в файле возвращается в начало.
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            return image.size
+    except OSError:
+        return None, None
+    finally:
+        file.seek(0)
+
+
+def file_digest(file, chunk_size=64 * 1024):
+    """SHA-256 содержимого файла; позиция возвращается в начало."""
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _convert(image, format):
+    if format == 'JPEG':
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA')
+    return image
+
+
+def render_variants(source, variants):
+    """
+    Варианты картинки с обрезкой по центру, как у sorl-thumbnail
+    с `crop="center"` и `upscale=True`. Файл декодируется один раз.
+
+    `source` — путь к файлу или его содержимое, `variants` — кортежи
+    `(size, format, quality, progressive, target)`. Если задан путь
+    `target`, вариант записывается туда и вместо байтов возвращается
+    `None`. Возвращает список пар (байты, размер) в порядке `variants`.
+    """
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+    results = []
+    for size, format, quality, progressive, target in variants:
+        variant = _convert(ImageOps.fit(image, size, Image.LANCZOS), format)
+        output = BytesIO()
+        params = {'quality': quality}
+        if format == 'JPEG':
+            params.update(optimize=True, progressive=progressive)
+        variant.save(output, format, **params)
+        if target is None:
+            results.append((output.getvalue(), variant.size))
+        else:
+            write_atomic(target, output.getvalue())
+            results.append((None, variant.size))
+    return results
@@ -0,0 +1,53 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import dependencies, object_cache
+from posts.models import Post
+
+FIELDS = ['image_width', 'image_height', 'image_hash']
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры и хеш картинок у постов, сохранённых '
+        'до появления этих полей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько постов обрабатывать в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        queryset = Post.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).filter(image_hash='').only('id', 'image').order_by('id')
+        last_id = 0
+        updated = missing = 0
+        while True:
+            # Посты без файла остаются незаполненными, поэтому следующая
+            # порция выбирается по id, а не по пустому хешу.
+            chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            posts = []
+            for post in chunk:
+                try:
+                    post.update_image_metadata(force=True)
+                except (OSError, SuspiciousFileOperation):
+                    missing += 1
+                    self.stderr.write(f'Нет файла {post.image.name}')
+                    continue
+                posts.append(post)
+            with transaction.atomic():
+                Post.objects.bulk_update(posts, FIELDS)
+            # `bulk_update` не посылает сигналов: сбрасываем кеш сами.
+            object_cache.forget(Post, *(post.pk for post in posts))
+            updated += len(posts)
+        if updated:
+            dependencies.invalidate(dependencies.ALL)
+        self.stdout.write(f'Обновлено: {updated}, без файла: {missing}')
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from posts.media_gc import MediaCollector
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов и миниатюры, на которые больше ничего '
+        'не ссылается, и записи о них в хранилище ключей sorl-thumbnail.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько файлов или записей проверять одним запросом.'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=None,
+            help='Не больше стольких удалений файлов в секунду.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе стольких секунд.'
+        )
+
+    def handle(self, *args, **options):
+        log = None
+        if options['verbosity'] > 1:
+            log = self.stdout.write
+        stats = MediaCollector(
+            dry_run=options['dry_run'],
+            chunk_size=options['chunk_size'],
+            rate=options['rate'],
+            min_age=options['min_age'],
+            log=log,
+        ).run()
+        reclaimed = stats['original_bytes'] + stats['thumbnail_bytes']
+        prefix = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            f'{prefix}: оригиналов {stats["original_files"]}, '
+            f'миниатюр {stats["thumbnail_files"]}, '
+            f'записей хранилища ключей {stats["kvstore_rows"]}, '
+            f'освобождено байт {reclaimed}'
+        )
@@ -0,0 +1,284 @@
+import bisect
+import hashlib
+import itertools
+import os
+import random
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from core import dependencies
+from posts.counters import reconcile
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.timeline import mark_popular
+
+WORDS = (
+    'яндекс практикум питон джанго пост лента подписка автор группа '
+    'комментарий картинка кеш индекс запрос страница сервер база данные '
+    'быстро медленно сегодня вчера новый старый интересно смотрите'
+).split()
+
+
+class ZipfChooser:
+    """Выбор элемента с вероятностью, убывающей как 1 / rank ** alpha."""
+
+    def __init__(self, items, alpha, rng):
+        self.items = items
+        self.rng = rng
+        weights = (1 / (rank ** alpha) for rank in range(1, len(items) + 1))
+        self.cumulative = list(itertools.accumulate(weights))
+
+    def __call__(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.items[bisect.bisect(self.cumulative, point)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетический набор данных для нагрузочных тестов: '
+        'пользователей, группы, посты с картинками, подписки и комментарии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько разных картинок создать в MEDIA_ROOT.'
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.3,
+            help='Доля постов с картинкой.'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного распределения авторов и подписок.'
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён пользователей и адресов групп.'
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        user_ids = self.create_users()
+        group_ids = self.create_groups()
+        images = self.create_images()
+        post_ids = self.create_posts(user_ids, group_ids, images)
+        self.create_follows(user_ids)
+        self.create_comments(user_ids, post_ids)
+        self.fill_timelines()
+        self.log('Пересчёт счётчиков…')
+        reconcile(chunk_size=self.batch_size)
+        mark_popular()
+        # Записи вставлены без сигналов: кеш сбрасывается целиком.
+        dependencies.invalidate(dependencies.ALL)
+        self.log('Готово.')
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def insert(self, model, objects):
+        """Вставляет объекты порциями по `--batch-size`."""
+        total = 0
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                return total
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            total += len(batch)
+
+    def backdate(self, model, field, ids):
+        """
+        Проставляет записям `model` с ключами `ids` случайные даты в поле
+        `field`. `bulk_create` заполняет поля `auto_now_add` текущим
+        временем, а `bulk_update` сохраняет заданные значения.
+        """
+        ids = iter(ids)
+        while True:
+            chunk = list(itertools.islice(ids, self.batch_size))
+            if not chunk:
+                return
+            with transaction.atomic():
+                model.objects.bulk_update(
+                    [model(pk=pk, **{field: self.random_date()})
+                     for pk in chunk],
+                    [field],
+                )
+
+    def random_date(self):
+        seconds = self.rng.random() * self.options['days'] * 24 * 3600
+        return self.now - timedelta(seconds=seconds)
+
+    def random_text(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        password = make_password(self.options['password'])
+        total = self.insert(User, (
+            User(username=f'{prefix}{i}', password=password)
+            for i in range(self.options['users'])
+        ))
+        self.log(f'Пользователей: {total}')
+        return array('q', User.objects.filter(
+            username__startswith=prefix
+        ).order_by('id').values_list('id', flat=True).iterator())
+
+    def create_groups(self):
+        prefix = self.options['prefix']
+        total = self.insert(Group, (
+            Group(
+                title=f'Группа {i}',
+                slug=f'{prefix}-{i}',
+                description=self.random_text(20),
+            )
+            for i in range(self.options['groups'])
+        ))
+        self.log(f'Групп: {total}')
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-'
+        ).values_list('id', flat=True))
+
+    def create_images(self):
+        """Картинки в MEDIA_ROOT: пары (имя, поля картинки поста)."""
+        images = []
+        directory = os.path.join(settings.MEDIA_ROOT, 'posts')
+        os.makedirs(directory, exist_ok=True)
+        for i in range(self.options['images']):
+            name = f'posts/{self.options["prefix"]}-{i}.jpg'
+            size = (self.rng.randint(640, 2000), self.rng.randint(480, 1500))
+            color = tuple(self.rng.randint(0, 255) for _ in range(3))
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            Image.new('RGB', size, color).save(path, quality=85)
+            with open(path, 'rb') as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            images.append((name, {
+                'image_width': size[0],
+                'image_height': size[1],
+                'image_hash': digest,
+            }))
+        if images:
+            self.log(f'Картинок: {len(images)}')
+        return images
+
+    def create_posts(self, user_ids, group_ids, images):
+        choose_author = ZipfChooser(user_ids, self.options['alpha'], self.rng)
+        ratio = self.options['image_ratio']
+
+        def posts():
+            for _ in range(self.options['posts']):
+                image, fields = '', {}
+                if images and self.rng.random() < ratio:
+                    image, fields = self.rng.choice(images)
+                yield Post(
+                    text=self.random_text(self.rng.randint(5, 60)),
+                    author_id=choose_author(),
+                    group_id=(
+                        self.rng.choice(group_ids)
+                        if group_ids and self.rng.random() < 0.5 else None
+                    ),
+                    image=image,
+                    **fields,
+                )
+
+        first_id = Post.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        total = self.insert(Post, posts())
+        self.log(f'Постов: {total}')
+        post_ids = array('q', Post.objects.filter(
+            id__gt=first_id
+        ).order_by('id').values_list('id', flat=True).iterator())
+        self.backdate(Post, 'pub_date', post_ids)
+        return post_ids
+
+    def create_follows(self, user_ids):
+        # Популярность авторов распределена по степенному закону:
+        # немногие авторы собирают большую часть подписчиков.
+        authors = list(user_ids)
+        self.rng.shuffle(authors)
+        choose_author = ZipfChooser(authors, self.options['alpha'], self.rng)
+        per_user = min(self.options['follows_per_user'], len(authors) - 1)
+
+        def follows():
+            for user_id in user_ids:
+                chosen = set()
+                attempts = 0
+                while len(chosen) < per_user and attempts < per_user * 10:
+                    attempts += 1
+                    author_id = choose_author()
+                    if author_id != user_id:
+                        chosen.add(author_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.log(f'Подписок: {self.insert(Follow, follows())}')
+
+    def create_comments(self, user_ids, post_ids):
+        if not post_ids:
+            return
+
+        def comments():
+            for _ in range(self.options['comments']):
+                yield Comment(
+                    text=self.random_text(self.rng.randint(3, 30)),
+                    author_id=self.rng.choice(user_ids),
+                    post_id=self.rng.choice(post_ids),
+                )
+
+        first_id = Comment.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        total = self.insert(Comment, comments())
+        self.log(f'Комментариев: {total}')
+        self.backdate(Comment, 'created', array('q', Comment.objects.filter(
+            id__gt=first_id
+        ).values_list('id', flat=True).iterator()))
+
+    def fill_timelines(self):
+        """
+        Раскладывает посты по лентам подписчиков одним INSERT … SELECT,
+        как это сделал бы `timeline.fan_out` для каждого поста.
+        """
+        timeline = TimelineEntry._meta.db_table
+        post = Post._meta.db_table
+        follow = Follow._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {timeline} (user_id, post_id, pub_date) '
+                f'SELECT f.user_id, p.id, p.pub_date FROM {follow} f '
+                f'JOIN {post} p ON p.author_id = f.author_id '
+                f'WHERE f.author_id NOT IN ('
+                f'  SELECT author_id FROM {follow} '
+                f'  GROUP BY author_id HAVING COUNT(*) > %s'
+                f') AND NOT EXISTS ('
+                f'  SELECT 1 FROM {timeline} t '
+                f'  WHERE t.user_id = f.user_id AND t.post_id = p.id'
+                f')',
+                [settings.TIMELINE_FANOUT_LIMIT],
+            )
+            self.log(f'Записей в лентах: {cursor.rowcount}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики записей, подписок и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк пересчитывать в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        processed = reconcile(chunk_size=options['chunk_size'])
+        for name, total in processed.items():
+            self.stdout.write(f'{name}: {total}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import restore_fan_out
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет ленты подписчиков авторов, которые перестали быть '
+        'популярными, их постами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Сколько авторов обработать за один запуск.'
+        )
+
+    def handle(self, *args, **options):
+        authors, followers = restore_fan_out(limit=options['limit'])
+        self.stdout.write(f'Авторов: {authors}, лент: {followers}')
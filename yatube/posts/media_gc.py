@@ -0,0 +1,194 @@
+"""
+Удаление файлов картинок и миниатюр, на которые больше ничего не ссылается.
+
+Картинки постов хранятся по хешу содержимого и могут принадлежать
+нескольким постам, поэтому при замене картинки или удалении поста файл
+остаётся. Сборщик проходит по хранилищу и по таблице хранилища ключей
+sorl-thumbnail порциями и удаляет:
+
+* записи исходных картинок, на которые не ссылается ни один пост,
+  вместе с их миниатюрами (файлами и записями);
+* исходные файлы в `posts/`, на которые не ссылается ни один пост;
+* файлы миниатюр, для которых нет записи в хранилище ключей.
+
+Файлы моложе `min_age` секунд не трогаются: их может как раз сохранять
+незавершённая загрузка или пул миниатюр. Запись исходной картинки
+удаляется, только если и исходный файл, и все её миниатюры старше
+`min_age`. Повторная загрузка того же содержимого обновляет время
+изменения файла (см. `ContentAddressedStorage`).
+"""
+import posixpath
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .models import Post
+
+
+def walk(storage, top):
+    """Имена всех файлов каталога `top`; читается по одному каталогу."""
+    try:
+        directories, files = storage.listdir(top)
+    except FileNotFoundError:
+        return
+    for name in sorted(files):
+        yield posixpath.join(top, name)
+    for directory in sorted(directories):
+        yield from walk(storage, posixpath.join(top, directory))
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def referenced_images(names):
+    return set(Post.objects.filter(image__in=names).values_list(
+        'image', flat=True
+    ))
+
+
+class MediaCollector:
+    """
+    Один проход сборщика. `rate` — не больше стольких удалений в секунду,
+    `dry_run` — только посчитать, что было бы удалено.
+    """
+
+    def __init__(self, dry_run=False, chunk_size=500, rate=None,
+                 min_age=3600, log=None):
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.rate = rate
+        self.cutoff = timezone.now() - timedelta(seconds=min_age)
+        self.log = log or (lambda message: None)
+        self.stats = Counter()
+        self._last_delete = None
+
+    def _throttle(self):
+        if not self.rate:
+            return
+        if self._last_delete is not None:
+            pause = 1 / self.rate - (time.monotonic() - self._last_delete)
+            if pause > 0:
+                time.sleep(pause)
+        self._last_delete = time.monotonic()
+
+    def _is_old(self, storage, name):
+        try:
+            return storage.get_modified_time(name) < self.cutoff
+        except (FileNotFoundError, NotImplementedError):
+            return True
+
+    def delete_file(self, storage, name, kind):
+        try:
+            size = storage.size(name)
+        except FileNotFoundError:
+            return
+        self.log(f'{kind}: {name} ({size} B)')
+        self.stats[f'{kind}_files'] += 1
+        self.stats[f'{kind}_bytes'] += size
+        if not self.dry_run:
+            self._throttle()
+            storage.delete(name)
+
+    def delete_rows(self, keys):
+        self.stats['kvstore_rows'] += len(keys)
+        if self.dry_run or not keys:
+            return
+        KVStoreModel.objects.filter(key__in=keys).delete()
+        default.kvstore.cache.delete_many(keys)
+
+    def _source_rows(self):
+        """Записи исходных картинок в хранилище ключей, порциями."""
+        prefix = add_prefix('', 'image')
+        queryset = KVStoreModel.objects.filter(
+            key__startswith=prefix
+        ).order_by('key')
+        last_key = ''
+        while True:
+            rows = list(queryset.filter(key__gt=last_key).values_list(
+                'key', 'value'
+            )[:self.chunk_size])
+            if not rows:
+                return
+            last_key = rows[-1][0]
+            images = [(key, deserialize_image_file(value))
+                      for key, value in rows]
+            yield [
+                (key, image) for key, image in images
+                if not image.name.startswith(sorl_settings.THUMBNAIL_PREFIX)
+            ]
+
+    def collect_sources(self):
+        for rows in self._source_rows():
+            used = referenced_images([image.name for _, image in rows])
+            for key, image in rows:
+                if image.name not in used:
+                    self._delete_source(key, image)
+
+    def _delete_source(self, key, image):
+        """Удаляет запись исходной картинки и все её миниатюры."""
+        if not self._is_old(image.storage, image.name):
+            return
+        list_key = add_prefix(del_prefix(key), 'thumbnails')
+        value = KVStoreModel.objects.filter(key=list_key).values_list(
+            'value', flat=True
+        ).first()
+        rows = KVStoreModel.objects.filter(key__in=[
+            add_prefix(thumbnail_key)
+            for thumbnail_key in (deserialize(value) if value else [])
+        ]).values_list('key', 'value')
+        thumbnails = [(thumbnail_key, deserialize_image_file(thumbnail_value))
+                      for thumbnail_key, thumbnail_value in rows]
+        if not all(self._is_old(thumbnail.storage, thumbnail.name)
+                   for _, thumbnail in thumbnails):
+            return
+        keys = [key] + ([list_key] if value else [])
+        for thumbnail_key, thumbnail in thumbnails:
+            self.delete_file(thumbnail.storage, thumbnail.name, 'thumbnail')
+            keys.append(thumbnail_key)
+        self.delete_rows(keys)
+
+    def collect_originals(self):
+        storage = Post._meta.get_field('image').storage
+        top = Post._meta.get_field('image').upload_to.rstrip('/')
+        for names in chunked(walk(storage, top), self.chunk_size):
+            used = referenced_images(names)
+            for name in names:
+                if name not in used and self._is_old(storage, name):
+                    self.delete_file(storage, name, 'original')
+
+    def collect_thumbnails(self):
+        storage = default.storage
+        top = sorl_settings.THUMBNAIL_PREFIX.rstrip('/')
+        for names in chunked(walk(storage, top), self.chunk_size):
+            keys = {
+                add_prefix(ImageFile(name, storage).key): name
+                for name in names
+            }
+            known = set(KVStoreModel.objects.filter(
+                key__in=list(keys)
+            ).values_list('key', flat=True))
+            for key, name in keys.items():
+                if key not in known and self._is_old(storage, name):
+                    self.delete_file(storage, name, 'thumbnail')
+
+    def run(self):
+        self.collect_sources()
+        self.collect_originals()
+        self.collect_thumbnails()
+        return self.stats
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-17 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='needs_backfill',
+            field=models.BooleanField(default=False, verbose_name='Ленты подписчиков не заполнены'),
+        ),
+    ]
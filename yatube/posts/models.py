@@ -1,13 +1,28 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+
+from core.object_cache import CachedManager, register
+
+from .imaging import file_digest, image_size
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
+# Поля пользователя, которые показываются на страницах и могут храниться
+# в кеше: пароль и почта там храниться не должны.
+PUBLIC_USER_FIELDS = ('username', 'first_name', 'last_name')
+# Авторов ищут по имени на страницах профиля и поста.
+register(User, fields=PUBLIC_USER_FIELDS)
 
 
 class Group(models.Model):
     title = models.CharField("Название группы", max_length=200)
     slug = models.SlugField("Сокращенное название группы", unique=True)
     description = models.TextField("Описание группы")
+    posts_count = models.PositiveIntegerField(
+        "Количество записей", default=0, editable=False
+    )
+
+    objects = CachedManager()
 
     def __str__(self) -> str:
         return self.title
@@ -33,7 +48,78 @@ class Post(models.Model):
         blank=True,
         null=True
     )
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(
+        upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        blank=True,
+        null=True,
+    )
+    # Заполняются при загрузке, чтобы не открывать файл при показе.
+    image_width = models.PositiveIntegerField(
+        "Ширина картинки", blank=True, null=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        "Высота картинки", blank=True, null=True, editable=False
+    )
+    image_hash = models.CharField(
+        "SHA-256 картинки", max_length=64, blank=True, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        "Количество комментариев", default=0, editable=False
+    )
+
+    objects = CachedManager()
+
+    class Meta:
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'], name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date'], name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_pub_date_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.update_image_metadata()
+        # Счётчики обновляются в обработчиках сигналов в той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def update_image_metadata(self, force=False):
+        """
+        Размеры и хеш картинки. Уже сохранённый файл читается только
+        при `force=True`, например при заполнении старых записей.
+
+        Новый файл сохраняется в хранилище здесь, а не при записи поля:
+        хранилище и так считает SHA-256 содержимого для имени файла,
+        и хеш берётся из имени, а не вычисляется второй раз.
+        """
+        if not self.image:
+            self.image_width = self.image_height = None
+            self.image_hash = ''
+            return
+        if not self.image._committed:
+            self.image_width, self.image_height = image_size(self.image.file)
+            self.image.save(self.image.name, self.image.file, save=False)
+        elif force:
+            with self.image.storage.open(self.image.name) as file:
+                self.image_width, self.image_height = image_size(file)
+        else:
+            return
+        self.image_hash = self._stored_image_hash()
+
+    def _stored_image_hash(self):
+        content_hash = getattr(self.image.storage, 'content_hash', None)
+        digest = content_hash(self.image.name) if content_hash else None
+        if digest is None:
+            with self.image.storage.open(self.image.name) as file:
+                digest = file_digest(file)
+        return digest
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -61,6 +147,15 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return self.text
@@ -87,6 +182,78 @@ class Follow(models.Model):
                 name='unique_follow'
             ),
         ]
+        indexes = [
+            # Подписчики автора читаются из индекса без обращения к таблице.
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return f'{self.user} подписан на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись ленты подписок: пост автора, на которого подписан пользователь.
+
+    Заполняется при публикации поста (fan-out on write), поэтому лента
+    «Избранные авторы» читается одним диапазоном по индексу
+    `(user, pub_date, post)`.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name="Сообщение",
+        related_name="timeline_entries"
+    )
+    pub_date = models.DateTimeField("date published")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.post_id} в ленте {self.user_id}'
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляемые при создании и удалении записей."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Пользователь",
+        related_name="stats"
+    )
+    posts_count = models.PositiveIntegerField("Записей", default=0)
+    followers_count = models.PositiveIntegerField("Подписчиков", default=0)
+    following_count = models.PositiveIntegerField("Подписок", default=0)
+    # Посты автора не раскладывались по лентам, пока он был популярным;
+    # ленты подписчиков заполняет команда `restore_timelines`.
+    needs_backfill = models.BooleanField(
+        "Ленты подписчиков не заполнены", default=False
+    )
+
+    def __str__(self) -> str:
+        return f'Счётчики {self.user_id}'
@@ -0,0 +1,213 @@
+import base64
+import copy
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинатор по ключу (`pub_date`, `id`).
+
+    Страницы выбираются запросом вида
+    `WHERE (pub_date, id) < (...) ORDER BY pub_date DESC, id DESC LIMIT n`,
+    поэтому время ответа не зависит от глубины страницы и `COUNT(*)`
+    не выполняется: о следующей странице известно только то, что она
+    есть, для чего выбирается на одну запись больше. Общее количество
+    записей считается только по требованию и не больше `count_limit`.
+
+    Курсор — непрозрачная строка с ключом крайней записи страницы
+    и номером страницы, чтобы шаблоны могли показывать номер.
+
+    Курсоры соседних страниц хранятся в самой странице (`page.next_cursor`,
+    `page.previous_cursor`), а её номер и наличие следующей — в копии
+    пагинатора `page.paginator`. Страница остаётся обычным `Page`, и
+    построение другой страницы тем же пагинатором её не меняет.
+    """
+
+    ordering = ('-pub_date', '-id')
+    # Состояние копии пагинатора, привязанной к странице.
+    _number = 1
+    has_more = False
+
+    def __init__(self, object_list, per_page, ordering=None,
+                 count_limit=None, **kwargs):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        if tuple(object_list.query.order_by) != self.ordering:
+            object_list = object_list.order_by(*self.ordering)
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_limit = count_limit
+
+    @cached_property
+    def count(self):
+        """Количество записей, но не больше `count_limit + 1`."""
+        if self.count_limit is None:
+            return super().count
+        return self.object_list[:self.count_limit + 1].count()
+
+    @property
+    def count_is_exact(self):
+        return self.count_limit is None or self.count <= self.count_limit
+
+    @property
+    def num_pages(self):
+        # Известны только текущая страница и наличие следующей.
+        return self._number + 1 if self.has_more else self._number
+
+    def _fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, obj, number):
+        opts = self.object_list.model._meta
+        values = [
+            opts.get_field(name).value_to_string(obj)
+            for name in self._fields()
+        ]
+        raw = json.dumps([number, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            number, values = json.loads(raw.decode())
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        fields = self._fields()
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise InvalidCursor(cursor)
+        opts = self.object_list.model._meta
+        try:
+            values = [
+                opts.get_field(name).to_python(value)
+                for name, value in zip(fields, values)
+            ]
+        except Exception:
+            raise InvalidCursor(cursor)
+        return max(number, 1), values
+
+    def _seek(self, values, forward):
+        """Условие «строго после» (или «строго до») ключа `values`."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        # Нестрогая граница по первому полю даёт базе диапазон по индексу,
+        # которого не видно в условии через OR.
+        name = self.ordering[0]
+        lookup = 'lte' if name.startswith('-') == forward else 'gte'
+        return Q(**{f'{name.lstrip("-")}__{lookup}': values[0]}) & condition
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def _make_page(self, rows, number, has_more):
+        paginator = copy.copy(self)
+        paginator._number = number
+        paginator.has_more = has_more
+        page = Page(rows, number, paginator)
+        page.has_more = has_more
+        page.next_cursor = page.previous_cursor = None
+        if rows and has_more:
+            page.next_cursor = self.encode_cursor(rows[-1], number)
+        if rows and number > 1:
+            page.previous_cursor = self.encode_cursor(rows[0], number)
+        return page
+
+    def restore_page(self, rows, number, has_more):
+        """Страница из ранее выбранных записей, например из кеша."""
+        return self._make_page(rows, number, has_more)
+
+    def page_after(self, cursor=None):
+        queryset = self.object_list
+        number = 1
+        if cursor is not None:
+            number, values = self.decode_cursor(cursor)
+            number += 1
+            queryset = queryset.filter(self._seek(values, forward=True))
+        rows = list(queryset[:self.per_page + 1])
+        return self._make_page(
+            rows[:self.per_page], number, len(rows) > self.per_page
+        )
+
+    def page_before(self, cursor):
+        number, values = self.decode_cursor(cursor)
+        queryset = self.object_list.filter(
+            self._seek(values, forward=False)
+        ).order_by(*self._reversed_ordering())
+        rows = list(queryset[:self.per_page + 1])
+        if len(rows) <= self.per_page:
+            # Дошли до начала ленты: отдаём полную первую страницу.
+            return self.page_after()
+        rows = rows[:self.per_page][::-1]
+        return self._make_page(rows, max(number - 1, 2), True)
+
+    def page_number(self, number):
+        """Страница по номеру `?page=N` для старых ссылок, без `COUNT(*)`."""
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = list(self.object_list[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            return self.page_after()
+        return self._make_page(
+            rows[:self.per_page], number, len(rows) > self.per_page
+        )
+
+    def requested_number(self, params):
+        """Номер страницы, которую вернёт `get_cursor_page(params)`."""
+        try:
+            if params.get('after'):
+                return self.decode_cursor(params['after'])[0] + 1
+            if params.get('before'):
+                return max(self.decode_cursor(params['before'])[0] - 1, 1)
+        except InvalidCursor:
+            return 1
+        try:
+            return max(int(params.get('page') or 1), 1)
+        except ValueError:
+            return 1
+
+    def get_cursor_page(self, params):
+        """
+        Страница по параметрам запроса `after`, `before` или `page`.
+        Некорректный курсор, как и в `get_page`, даёт первую страницу.
+        """
+        try:
+            if params.get('after'):
+                return self.page_after(params['after'])
+            if params.get('before'):
+                return self.page_before(params['before'])
+        except InvalidCursor:
+            return self.page_after()
+        if params.get('page'):
+            return self.page_number(params['page'])
+        return self.page_after()
+
+
+def get_paginator(object_list, **kwargs):
+    kwargs.setdefault(
+        'count_limit', getattr(settings, 'PAGINATOR_COUNT_LIMIT', None)
+    )
+    return CursorPaginator(object_list, settings.ITEMS_PER_PAGE, **kwargs)
+
+
+def paginate(request, object_list, **kwargs):
+    return get_paginator(object_list, **kwargs).get_cursor_page(request.GET)
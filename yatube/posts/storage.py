@@ -0,0 +1,86 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — SHA-256 его содержимого:
+    `posts/ab/cd/<хеш>.jpg`. Одинаковые файлы хранятся один раз,
+    и у постов с одной и той же картинкой общие миниатюры.
+
+    Хеш считается по частям во время записи во временный файл, который
+    затем переименовывается; если такой файл уже есть, копия удаляется.
+    Файл может принадлежать нескольким постам, поэтому при замене
+    картинки он не удаляется: неиспользуемые файлы убирает `gc_media`.
+    """
+
+    def hashed_name(self, name, digest):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def content_hash(self, name):
+        """SHA-256 содержимого по имени файла или `None` для чужих имён."""
+        stem = os.path.splitext(posixpath.basename(name))[0]
+        if len(stem) == 64 and all(c in '0123456789abcdef' for c in stem):
+            return stem
+        return None
+
+    def get_available_name(self, name, max_length=None):
+        # Окончательное имя определяется содержимым в `_save`.
+        return name
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        old_umask = os.umask(0)
+        try:
+            os.makedirs(directory, self.directory_permissions_mode,
+                        exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    def _reuse(self, full_path):
+        """
+        Есть ли уже файл с таким содержимым. Время изменения найденного
+        файла обновляется: `gc_media` не трогает свежие файлы и не удалит
+        его, пока сохраняется ссылающийся на него пост.
+        """
+        try:
+            os.utime(full_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        directory = os.path.dirname(self.path(name))
+        self._makedirs(directory)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            name = self.hashed_name(name, digest.hexdigest())
+            full_path = self.path(name)
+            if self._reuse(full_path):
+                os.unlink(temp_path)
+                return name
+            self._makedirs(os.path.dirname(full_path))
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
@@ -0,0 +1,18 @@
+from django import template
+
+from posts import card_cache
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_post_cards(page):
+    """Находит карточки всех постов страницы одним обращением к кешу."""
+    card_cache.prefetch_cards(page.object_list)
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из кеша со ссылками для текущего пользователя."""
+    return card_cache.render_card(post, context.get('user'))
@@ -0,0 +1,13 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def card_image(post):
+    """Варианты картинки карточки или `None`: тогда показывается заглушка."""
+    if hasattr(post, 'prefetched_card_image'):
+        return post.prefetched_card_image
+    return thumbnails.card_image(post.image, post.image_width)
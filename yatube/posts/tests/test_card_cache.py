@@ -0,0 +1,126 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import card_cache
+from posts.models import Comment, Group, Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class CardCacheTest(TestCase):
+    """Тестируется кеш отрендеренных карточек постов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Заголовок тестовой группы',
+            slug='test-group',
+            description='Тестовый текст'
+        )
+        cls.author = User.objects.create(username='MrSmith')
+        cls.reader = User.objects.create(username='MrAnon')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def fetch(self):
+        return Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+
+    def test_page_reads_cards_with_one_get_many(self):
+        """Карточки страницы читаются из кеша одним обращением."""
+        self.reader_client.get(reverse('index'))
+        with mock.patch.object(card_cache.cache, 'get_many',
+                               wraps=card_cache.cache.get_many) as get_many, \
+                mock.patch.object(card_cache, 'render_to_string') as render:
+            self.reader_client.get(reverse('index'))
+        card_calls = [
+            call for call in get_many.call_args_list
+            if all(key.startswith('post_card:') for key in call[0][0])
+        ]
+        self.assertEqual(len(card_calls), 1)
+        render.assert_not_called()
+
+    def test_edit_link_is_rendered_per_user(self):
+        """Ссылку на правку видит только автор, хотя карточка общая."""
+        edit_url = reverse('post_edit',
+                           args=[self.author.username, self.post.id])
+        response = self.reader_client.get(reverse('index'))
+        self.assertNotContains(response, edit_url)
+        self.assertNotContains(response, card_cache.ACTIONS_MARKER)
+        response = self.author_client.get(reverse('index'))
+        self.assertContains(response, edit_url)
+        response = self.reader_client.get(reverse('index'))
+        self.assertNotContains(response, edit_url)
+
+    def test_key_changes_with_shown_data(self):
+        """Правка, комментарий и переименования меняют ключ карточки."""
+        keys = {card_cache.card_key(self.fetch())}
+        changes = [
+            lambda: Post.objects.filter(pk=self.post.pk).update(
+                text='Новый текст'
+            ),
+            lambda: Comment.objects.create(post=self.post, author=self.reader,
+                                           text='Комментарий'),
+            lambda: User.objects.filter(pk=self.author.pk).update(
+                username='MrSmith2'
+            ),
+            lambda: Group.objects.filter(pk=self.group.pk).update(
+                title='Новое название'
+            ),
+        ]
+        for change in changes:
+            change()
+            keys.add(card_cache.card_key(self.fetch()))
+        self.assertEqual(len(keys), len(changes) + 1)
+
+    def test_edited_post_is_shown(self):
+        """После правки поста показывается новая карточка."""
+        self.reader_client.get(reverse('index'))
+        post = self.fetch()
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.reader_client.get(reverse('index'))
+        self.assertContains(response, 'Исправленный текст')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class CardPlaceholderCacheTest(TestCase):
+    """Карточка с заглушкой вместо картинки не кешируется."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_placeholder_is_not_cached(self):
+        cache.clear()
+        output = BytesIO()
+        Image.new('RGB', (1000, 400), (1, 2, 3)).save(output, 'JPEG')
+        post = Post.objects.create(
+            text='Пост', author=User.objects.create(username='MrSmith'),
+            image=SimpleUploadedFile('photo.jpg', output.getvalue(),
+                                     'image/jpeg'),
+        )
+        post = Post.objects.select_related('author', 'group').get(pk=post.pk)
+        with mock.patch('posts.thumbnails.schedule'):
+            html = card_cache.render_card(post)
+        self.assertIn('bg-light', html)
+        self.assertIsNone(cache.get(card_cache.card_key(post)))
@@ -0,0 +1,256 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDatasetTests(TestCase):
+    """Тестируется команда `generate_dataset`."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def generate(self, **options):
+        options = {
+            'users': 20, 'posts': 100, 'follows_per_user': 5,
+            'comments': 50, 'groups': 3, 'images': 2, 'batch_size': 30,
+            **options,
+        }
+        call_command('generate_dataset', stdout=StringIO(), **options)
+
+    def test_creates_requested_volumes(self):
+        """Создаётся заданное количество записей каждого вида."""
+        self.generate()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertEqual(Follow.objects.count(), 20 * 5)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertFalse(
+            Post.objects.exclude(image='').filter(image_hash='').exists()
+        )
+
+    def test_timelines_and_counters_are_filled(self):
+        """Ленты подписок и счётчики заполняются после вставки."""
+        self.generate()
+        expected = Post.objects.filter(
+            author__following__isnull=False
+        ).count()
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+        author = User.objects.order_by('-stats__posts_count').first()
+        self.assertEqual(author.stats.posts_count, author.posts.count())
+
+    def test_dates_are_spread(self):
+        """Даты постов и комментариев разбросаны по заданному периоду."""
+        self.generate(days=30)
+        for model, name in ((Post, 'pub_date'), (Comment, 'created')):
+            with self.subTest(model=model.__name__):
+                dates = model.objects.values_list(name, flat=True)
+                self.assertLess(min(dates), timezone.now() - timedelta(days=1))
+                self.assertGreater(min(dates),
+                                   timezone.now() - timedelta(days=31))
+                self.assertTrue(model._meta.get_field(name).auto_now_add)
+
+    def test_same_seed_gives_same_data(self):
+        """Одинаковый `--seed` даёт одинаковые данные."""
+        self.generate(seed=7)
+        first = list(Post.objects.order_by('id').values_list(
+            'text', 'author__username'
+        ))
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.generate(seed=7)
+        second = list(Post.objects.order_by('id').values_list(
+            'text', 'author__username'
+        ))
+        self.assertEqual(first, second)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillImageMetadataTests(TestCase):
+    """Тестируется команда `backfill_image_metadata`."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='MrSmith')
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        output = BytesIO()
+        Image.new('RGB', (300, 200)).save(output, 'PNG')
+        cls.content = output.getvalue()
+        with open(os.path.join(TEMP_MEDIA_ROOT, 'posts/old.png'), 'wb') as f:
+            f.write(cls.content)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_fills_metadata_in_chunks(self):
+        """Размеры и хеш заполняются порциями, посты без файла пропускаются."""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.user,
+                                image='posts/old.png')
+            for i in range(3)
+        ]
+        missing = Post.objects.create(text='Без файла', author=self.user,
+                                      image='posts/missing.png')
+        stdout = StringIO()
+        call_command('backfill_image_metadata', chunk_size=2,
+                     stdout=stdout, stderr=StringIO())
+        self.assertIn('Обновлено: 3, без файла: 1', stdout.getvalue())
+        expected = hashlib.sha256(self.content).hexdigest()
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(
+                (post.image_width, post.image_height, post.image_hash),
+                (300, 200, expected),
+            )
+        missing.refresh_from_db()
+        self.assertIsNone(missing.image_width)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class GcMediaTests(TestCase):
+    """Тестируется команда `gc_media`."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='MrSmith')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.kept = self.create_post((1, 2, 3))
+        self.replaced = self.create_post((4, 5, 6))
+        self.old_name = self.replaced.image.name
+        thumbnails.card_image(self.kept.image, self.kept.image_width)
+        thumbnails.card_image(self.replaced.image,
+                              self.replaced.image_width)
+        self.old_variants = [
+            thumbnail.name for _, thumbnail in
+            thumbnails._card_variant_files(self.replaced.image, 1000)
+        ]
+        self.replaced.image = self.upload((7, 8, 9))
+        self.replaced.save()
+        self.stray = default_storage.save('cache/zz/zz/stray.jpg',
+                                          ContentFile(b'stray'))
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, color):
+        output = BytesIO()
+        Image.new('RGB', (1000, 400), color).save(output, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', output.getvalue(),
+                                  'image/jpeg')
+
+    def create_post(self, color):
+        return Post.objects.create(text='Пост', author=self.user,
+                                   image=self.upload(color))
+
+    def gc(self, **options):
+        stdout = StringIO()
+        call_command('gc_media', min_age=0, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        """Пробный запуск только сообщает, что было бы удалено."""
+        output = self.gc(dry_run=True)
+        self.assertIn('Будет удалено: оригиналов 1, миниатюр 5', output)
+        storage = self.replaced.image.storage
+        self.assertTrue(storage.exists(self.old_name))
+        self.assertTrue(default_storage.exists(self.stray))
+
+    def test_removes_unreferenced_files_and_rows(self):
+        """Удаляются старая картинка, её миниатюры, записи и лишние файлы."""
+        old_size = self.replaced.image.storage.size(self.old_name)
+        output = self.gc()
+        self.assertIn('Удалено: оригиналов 1, миниатюр 5', output)
+        self.assertIn('записей хранилища ключей 6', output)
+        storage = self.replaced.image.storage
+        self.assertFalse(storage.exists(self.old_name))
+        self.assertFalse(default_storage.exists(self.stray))
+        for name in self.old_variants:
+            self.assertFalse(default_storage.exists(name))
+        reclaimed = int(output.rsplit(' ', 1)[1])
+        self.assertGreater(reclaimed, old_size)
+        self.assertTrue(storage.exists(self.kept.image.name))
+        self.assertTrue(storage.exists(self.replaced.image.name))
+        self.assertIsNotNone(
+            thumbnails.card_image(self.kept.image, self.kept.image_width)
+        )
+        self.assertIn('оригиналов 0, миниатюр 0', self.gc())
+
+    def test_recent_files_are_kept(self):
+        """Недавно записанные файлы не удаляются."""
+        stdout = StringIO()
+        call_command('gc_media', stdout=stdout)
+        self.assertIn('оригиналов 0, миниатюр 0', stdout.getvalue())
+        self.assertTrue(default_storage.exists(self.stray))
+
+    def age(self, storage, name):
+        past = time.time() - 7200
+        os.utime(storage.path(name), (past, past))
+
+    def test_reuploaded_blob_is_kept(self):
+        """Повторная загрузка старого файла защищает его от сборщика."""
+        storage = self.replaced.image.storage
+        self.age(storage, self.old_name)
+        for name in self.old_variants:
+            self.age(default_storage, name)
+        # Пост с этой картинкой ещё не сохранён: файл ни на что не ссылается.
+        name = storage.save('posts/photo.jpg', self.upload((4, 5, 6)))
+        self.assertEqual(name, self.old_name)
+        stdout = StringIO()
+        call_command('gc_media', stdout=stdout)
+        self.assertIn('оригиналов 0, миниатюр 0', stdout.getvalue())
+        self.assertTrue(storage.exists(self.old_name))
+
+    def test_old_unreferenced_blob_is_removed(self):
+        """Старые файлы удаляются и с ограничением по возрасту."""
+        storage = self.replaced.image.storage
+        self.age(storage, self.old_name)
+        for name in self.old_variants:
+            self.age(default_storage, name)
+        stdout = StringIO()
+        call_command('gc_media', stdout=stdout)
+        self.assertIn('оригиналов 1, миниатюр 4', stdout.getvalue())
+        self.assertFalse(storage.exists(self.old_name))
+
+    def test_rate_limit(self):
+        """Удаления файлов растягиваются во времени по `--rate`."""
+        with mock.patch('posts.media_gc.time.sleep') as sleep:
+            self.gc(rate=10)
+        self.assertGreaterEqual(sleep.call_count, 5)
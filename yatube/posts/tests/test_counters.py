@@ -0,0 +1,120 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import dependencies
+from core.object_cache import get_cached
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    """Тестируются счётчики записей, подписок и комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Заголовок тестовой группы',
+            slug='test-group',
+            description='Тестовый текст'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-group',
+            description='Тестовый текст'
+        )
+        cls.author = User.objects.create(username='MrSmith')
+        cls.user = User.objects.create(username='MrAnon')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Счётчики записей автора и группы следуют за записями."""
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group
+        )
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_comment_and_follow_counters(self):
+        """Счётчики комментариев и подписок следуют за записями."""
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        Comment.objects.create(text='Комментарий', author=self.user, post=post)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        Follow.objects.filter(user=self.user).delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_drifted_counter_does_not_go_negative(self):
+        """Удаление при разошедшемся нулевом счётчике не падает."""
+        group = Group.objects.create(title='Группа', slug='drift')
+        post = Post.objects.create(text='Тестовый пост', author=self.author,
+                                   group=group)
+        Comment.objects.bulk_create([
+            Comment(text='Комментарий', author=self.user, post=post)
+        ])
+        Group.objects.filter(pk=group.pk).update(posts_count=0)
+        UserStats.objects.filter(user=self.author).update(posts_count=0)
+        Comment.objects.get(post=post).delete()
+        post.delete()
+        group.refresh_from_db()
+        self.assertEqual(group.posts_count, 0)
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_profile_does_not_aggregate(self):
+        """Профиль берёт счётчики из `UserStats`, а не из `COUNT`."""
+        Post.objects.create(text='Тестовый пост', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(
+                reverse('profile', kwargs={'username': self.author.username})
+            )
+        self.assertEqual(response.context['post_count'], 1)
+        for query in queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_reconcile_counters(self):
+        """Команда `reconcile_counters` исправляет расхождения."""
+        Post.objects.bulk_create(
+            Post(text='Тестовый пост', author=self.author, group=self.group)
+            for _ in range(3)
+        )
+        UserStats.objects.filter(user=self.author).delete()
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+
+    def test_reconcile_resets_caches(self):
+        """После пересчёта кеши записей и страниц не показывают старое."""
+        Post.objects.bulk_create(
+            Post(text='Тестовый пост', author=self.author, group=self.group)
+            for _ in range(2)
+        )
+        cache.clear()
+        self.assertEqual(get_cached(Group, pk=self.group.pk).posts_count, 0)
+        stamp = dependencies.stamp(['index'])
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(get_cached(Group, pk=self.group.pk).posts_count, 2)
+        self.assertNotEqual(dependencies.stamp(['index']), stamp)
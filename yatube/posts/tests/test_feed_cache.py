@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from posts import feed_cache
+from posts.models import Post
+from posts.paginator import get_paginator
+
+User = get_user_model()
+
+
+@override_settings(ITEMS_PER_PAGE=10, INDEX_CACHE_PAGES=5)
+class IndexPageCacheTests(TestCase):
+    """Тестируется кеш страниц главной."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            'author', 'author@example.com', 'secret'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author) for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def get_page(self, query=''):
+        request = self.factory.get('/' + query)
+        paginator = get_paginator(feed_cache.index_posts())
+        return feed_cache.get_index_page(request, paginator)
+
+    def cached_keys(self, query):
+        """Ключи кеша, которые читает запрос `query`."""
+        keys = []
+        original = feed_cache.get_or_compute
+
+        def recording(key, *args, **kwargs):
+            keys.append(key)
+            return original(key, *args, **kwargs)
+
+        with mock.patch.object(feed_cache, 'get_or_compute', recording):
+            page = self.get_page(query)
+        return keys, page
+
+    def test_author_credentials_are_not_cached(self):
+        """Пароль и почта автора не попадают в кеш вместе с постами."""
+        self.get_page()
+        rows = cache.get(feed_cache.page_key(1))[0][0]
+        author = rows[0].author
+        self.assertEqual(author.username, 'author')
+        self.assertNotIn('password', author.__dict__)
+        self.assertNotIn('email', author.__dict__)
+
+    def test_cursor_navigation_uses_cache(self):
+        """Переходы по ссылкам страниц читаются из кеша."""
+        first = self.get_page()
+        second = self.get_page(f'?after={first.next_cursor}')
+        third = self.get_page(f'?after={second.next_cursor}')
+        with self.assertNumQueries(0):
+            again = self.get_page(f'?after={first.next_cursor}')
+            back = self.get_page(f'?before={third.previous_cursor}')
+            numbered = self.get_page('?page=2')
+        for page in (again, back, numbered):
+            self.assertEqual(list(page.object_list), list(second.object_list))
+            self.assertEqual(page.number, 2)
+            self.assertEqual(page.next_cursor, second.next_cursor)
+
+    def test_query_strings_do_not_add_entries(self):
+        """Некорректные и чужие курсоры не создают записей в кеше."""
+        for query in ('?after=garbage', '?before=x', '?page=abc',
+                      '?page=01'):
+            with self.subTest(query=query):
+                keys, page = self.cached_keys(query)
+                self.assertEqual(keys, [feed_cache.page_key(1)])
+                self.assertEqual(page.number, 1)
+
+    def test_forged_cursor_is_not_cached(self):
+        """Курсор, не ведущий на границу страницы, выполняется без кеша."""
+        paginator = get_paginator(feed_cache.index_posts())
+        posts = list(paginator.object_list)
+        forged = paginator.encode_cursor(posts[3], 1)
+        page = self.get_page(f'?after={forged}')
+        self.assertEqual(list(page.object_list), posts[4:14])
+        rows = cache.get(feed_cache.page_key(2))[0][0]
+        self.assertEqual(rows, posts[10:20])
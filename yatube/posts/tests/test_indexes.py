@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return ' | '.join(str(row[-1]) for row in cursor.fetchall())
+
+
+class FeedIndexesTests(TestCase):
+    """
+    Тестируется, что основные запросы лент читают данные по индексу
+    и не сортируют выборку во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Заголовок тестовой группы',
+            slug='test-group',
+            description='Тестовый текст'
+        )
+        cls.author = User.objects.create(username='MrSmith')
+        cls.user = User.objects.create(username='MrAnon')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for _ in range(3):
+            cls.post = Post.objects.create(
+                text='Тестовый пост', author=cls.author, group=cls.group
+            )
+        Comment.objects.create(
+            text='Комментарий', author=cls.user, post=cls.post
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def feed_queries(self, url, table):
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and f'FROM "{table}"' in query['sql']
+            and 'ORDER BY' in query['sql']
+        ]
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы страниц ленты используют индексы."""
+        urls = {
+            reverse('index'): 'posts_post',
+            reverse('group', kwargs={'slug': self.group.slug}): 'posts_post',
+            reverse(
+                'profile', kwargs={'username': self.author.username}
+            ): 'posts_post',
+            reverse('follow_index'): 'posts_timelineentry',
+            reverse('post_view', kwargs={
+                'username': self.author.username, 'post_id': self.post.id
+            }): 'posts_comment',
+        }
+        for url, table in urls.items():
+            with self.subTest(url=url):
+                queries = self.feed_queries(url, table)
+                self.assertTrue(queries)
+                for sql in queries:
+                    plan = query_plan(sql)
+                    self.assertIn('INDEX', plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_default_ordering(self):
+        """Посты по умолчанию упорядочены от новых к старым."""
+        self.assertEqual(
+            list(Post.objects.all()),
+            list(Post.objects.order_by('-pub_date', '-id'))
+        )
@@ -1,5 +1,14 @@
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
 
 from posts.models import Group, Post
 
@@ -31,3 +40,65 @@ class PostsModelsTest(TestCase):
         post = PostsModelsTest.post
         expected_object_name = post.text
         self.assertEqual(expected_object_name, str(post))
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageMetadataTest(TestCase):
+    """Тестируется сохранение размеров и хеша картинки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='BondarV')
+        output = BytesIO()
+        Image.new('RGB', (640, 480)).save(output, 'JPEG')
+        cls.content = output.getvalue()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.author,
+            image=SimpleUploadedFile('photo.jpg', self.content, 'image/jpeg'),
+        )
+
+    def test_metadata_saved_on_upload(self):
+        """При загрузке сохраняются размеры и SHA-256 картинки."""
+        post = self.create_post()
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (640, 480))
+        self.assertEqual(post.image_hash,
+                         hashlib.sha256(self.content).hexdigest())
+        with post.image.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_upload_is_hashed_once(self):
+        """Хеш новой картинки считает только хранилище."""
+        with mock.patch('hashlib.sha256', wraps=hashlib.sha256) as sha256:
+            post = self.create_post()
+        self.assertEqual(sha256.call_count, 1)
+        self.assertEqual(post.image_hash,
+                         hashlib.sha256(self.content).hexdigest())
+
+    def test_saved_file_is_not_reopened(self):
+        """Уже сохранённая картинка при сохранении поста не читается."""
+        post = Post.objects.get(pk=self.create_post().pk)
+        post.text = 'Новый текст'
+        post.image.storage.delete(post.image.name)
+        post.save()
+        self.assertEqual(post.image_width, 640)
+
+    def test_metadata_cleared_with_image(self):
+        """Без картинки поля размеров и хеша очищаются."""
+        post = self.create_post()
+        post.image = None
+        post.save()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_hash, '')
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginator import CursorPaginator
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    """Тестируется пагинация ленты по курсору."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='MrSmith')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author) for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_pages_cover_feed_without_gaps(self):
+        """Переход по курсорам `after` обходит всю ленту по порядку."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.page_after()
+        seen = list(page.object_list)
+        while page.has_next():
+            page = paginator.page_after(page.next_cursor)
+            seen.extend(page.object_list)
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        self.assertEqual(seen, expected)
+
+    def test_before_returns_previous_page(self):
+        """Курсор `before` возвращает предыдущую страницу."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.page_after()
+        second = paginator.page_after(first.next_cursor)
+        third = paginator.page_after(second.next_cursor)
+        self.assertEqual(third.number, 3)
+        self.assertFalse(third.has_next())
+        back = paginator.page_before(third.previous_cursor)
+        self.assertEqual(list(back.object_list), list(second.object_list))
+        self.assertEqual(back.number, 2)
+
+    def test_page_does_not_count_rows(self):
+        """Страница ленты строится одним запросом, без `COUNT(*)`."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.page_after().next_cursor
+        with self.assertNumQueries(1):
+            paginator.page_after(cursor)
+
+    def test_pages_keep_their_own_links(self):
+        """Построение другой страницы не меняет ссылки первой."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.page_after()
+        cursor = first.next_cursor
+        third = paginator.page_after(
+            paginator.page_after(cursor).next_cursor
+        )
+        self.assertEqual(first.next_cursor, cursor)
+        self.assertIsNone(first.previous_cursor)
+        self.assertTrue(first.has_next())
+        self.assertFalse(third.has_next())
+        self.assertIs(type(first), Page)
+
+    def test_count_limit(self):
+        """Подсчёт записей ограничен `count_limit`."""
+        paginator = CursorPaginator(Post.objects.all(), 10, count_limit=5)
+        self.assertEqual(paginator.count, 6)
+        self.assertFalse(paginator.count_is_exact)
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор в адресе приводит на первую страницу."""
+        response = self.client.get(reverse('index') + '?after=garbage')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['page'].has_next())
+        self.assertFalse(response.context['page'].has_previous())
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.query_budget import assert_query_budget
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedQueriesTests(TestCase):
+    """
+    Тестируется, что число запросов на страницу ленты не зависит
+    от числа постов на ней: автор, группа и комментарии не должны
+    запрашиваться для каждой карточки отдельно.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Заголовок тестовой группы',
+            slug='test-group',
+            description='Тестовый текст'
+        )
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        cls.user = User.objects.create(username='MrAnon')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.admin)
+
+    def add_posts(self, count):
+        for _ in range(count):
+            author = User.objects.create(
+                username=f'author{User.objects.count()}'
+            )
+            Follow.objects.create(user=self.admin, author=author)
+            Follow.objects.create(user=self.user, author=author)
+            post = Post.objects.create(
+                text='Тестовый пост', author=author, group=self.group
+            )
+            Comment.objects.create(
+                text='Комментарий', author=self.user, post=post
+            )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_pages_have_constant_query_count(self):
+        """Число запросов к лентам и спискам админки не зависит от строк."""
+        urls = (
+            reverse('index'),
+            reverse('group', kwargs={'slug': self.group.slug}),
+            reverse('follow_index'),
+            reverse('admin:posts_post_changelist'),
+            reverse('admin:posts_comment_changelist'),
+            reverse('admin:posts_follow_changelist'),
+        )
+        self.add_posts(1)
+        single = {url: self.count_queries(url) for url in urls}
+        self.add_posts(9)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), single[url])
+
+    def test_profile_has_constant_query_count(self):
+        """Число запросов к профилю не растёт с числом постов."""
+        author = User.objects.create(username='MrSmith')
+        url = reverse('profile', kwargs={'username': author.username})
+        Post.objects.create(text='Тестовый пост', author=author)
+        single = self.count_queries(url)
+        for _ in range(9):
+            post = Post.objects.create(
+                text='Тестовый пост', author=author, group=self.group
+            )
+            Comment.objects.create(
+                text='Комментарий', author=self.user, post=post
+            )
+        self.assertEqual(self.count_queries(url), single)
+
+    def test_views_fit_query_budget(self):
+        """Страницы укладываются в бюджет запросов из настроек."""
+        self.add_posts(10)
+        post = Post.objects.first()
+        urls = {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': self.group.slug}),
+            'follow_index': reverse('follow_index'),
+            'profile': reverse(
+                'profile', kwargs={'username': post.author.username}
+            ),
+            'post_view': reverse('post_view', kwargs={
+                'username': post.author.username, 'post_id': post.id
+            }),
+        }
+        for url_name, url in urls.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with assert_query_budget(url_name):
+                    self.authorized_client.get(url)
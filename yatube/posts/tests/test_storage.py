@@ -0,0 +1,99 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (SimpleUploadedFile,
+                                            TemporaryUploadedFile)
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post
+from posts.storage import ContentAddressedStorage
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(color=(10, 20, 30)):
+    output = BytesIO()
+    Image.new('RGB', (1000, 400), color).save(output, 'JPEG')
+    return output.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    """Тестируется хранение картинок по хешу содержимого."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='MrSmith')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.storage = ContentAddressedStorage()
+
+    def stored_files(self):
+        return [
+            os.path.join(root, name)
+            for root, _, names in os.walk(os.path.join(TEMP_MEDIA_ROOT,
+                                                       'posts'))
+            for name in names
+        ]
+
+    def test_name_is_content_hash(self):
+        """Имя файла — SHA-256 содержимого с исходным расширением."""
+        content = b'content'
+        digest = hashlib.sha256(content).hexdigest()
+        name = self.storage.save('posts/Photo.JPG', ContentFile(content))
+        self.assertEqual(
+            name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+
+    def test_same_content_stored_once(self):
+        """Одинаковое содержимое хранится одним файлом без временных."""
+        before = len(self.stored_files())
+        first = self.storage.save('posts/a.jpg', ContentFile(b'same'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'same'))
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.stored_files()), before + 1)
+
+    def test_temporary_upload_is_streamed(self):
+        """Загрузка, сохранённая на диск, копируется по частям."""
+        content = os.urandom(3 * 1024 * 1024)
+        upload = TemporaryUploadedFile('big.bin', 'application/octet-stream',
+                                       len(content), None)
+        upload.write(content)
+        upload.seek(0)
+        name = self.storage.save('posts/big.bin', upload)
+        upload.close()
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_posts_share_image_and_thumbnails(self):
+        """Посты с одинаковой картинкой используют общий файл и миниатюры."""
+        content = make_image()
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.user,
+                image=SimpleUploadedFile(f'copy{i}.jpg', content,
+                                         'image/jpeg'),
+            )
+            for i in range(2)
+        ]
+        self.assertEqual(posts[0].image.name, posts[1].image.name)
+        thumbnails.build(posts[0].image, posts[0].image_width)
+        card = thumbnails.card_image(posts[1].image, posts[1].image_width)
+        self.assertIsNotNone(card)
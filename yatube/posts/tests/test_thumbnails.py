@@ -0,0 +1,378 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from io import BytesIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.forms import PostForm
+from posts.imaging import (ORIENTATION, ImageTooLarge, prepare_upload,
+                           render_variants)
+from posts.models import Group, Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(size=(1200, 800), format='JPEG', exif=None):
+    output = BytesIO()
+    image = Image.new('RGB', size, (200, 30, 30))
+    params = {}
+    if exif:
+        params['exif'] = Image.Exif()
+        params['exif'].update(exif)
+    image.save(output, format, **params)
+    return output.getvalue()
+
+
+class RenderVariantsTest(TestCase):
+    """Тестируется построение вариантов картинки в процессе пула."""
+
+    def test_crops_to_variant_sizes(self):
+        """Каждый вариант обрезается до своего размера и формата."""
+        results = render_variants(make_image(), [
+            ((480, 170), 'WEBP', 80, True, None),
+            ((960, 339), 'JPEG', 95, True, None),
+        ])
+        self.assertEqual([size for _, size in results],
+                         [(480, 170), (960, 339)])
+        for (data, size), format in zip(results, ('WEBP', 'JPEG')):
+            with Image.open(BytesIO(data)) as image:
+                self.assertEqual(image.format, format)
+                self.assertEqual(image.size, size)
+
+    def test_upscales_small_image(self):
+        """Маленькая картинка увеличивается, как с `upscale=True`."""
+        [(_, size)] = render_variants(
+            make_image((10, 10), 'PNG'), [((960, 339), 'PNG', 95, True, None)]
+        )
+        self.assertEqual(size, (960, 339))
+
+
+# Запускается в отдельном процессе: печатает, на сколько килобайт вырос
+# пиковый объём памяти процесса при обработке картинки. Берётся VmHWM,
+# а не ru_maxrss: тот наследует пик родительского процесса.
+MEMORY_SCRIPT = """
+import sys
+from io import BytesIO
+from PIL import Image
+from posts.imaging import prepare_upload
+
+def peak():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+path, mode = sys.argv[1:]
+before = peak()
+if mode == 'full':
+    with Image.open(path) as image:
+        image.load()
+else:
+    with open(path, 'rb') as source:
+        prepare_upload(source, BytesIO(), 1000, 25 * 10 ** 6)
+print(peak() - before)
+"""
+
+
+def prepare(data, max_edge=2560, max_pixels=25 * 10 ** 6):
+    output = BytesIO()
+    if not prepare_upload(BytesIO(data), output, max_edge, max_pixels):
+        return None
+    return output.getvalue()
+
+
+class PrepareUploadTest(TestCase):
+    """Тестируется обработка картинки при загрузке."""
+
+    def test_rotates_and_strips_exif(self):
+        """Картинка поворачивается по EXIF, а EXIF удаляется."""
+        data = prepare(make_image(
+            (300, 100), exif={ORIENTATION: 6, 0x010F: 'Camera'}
+        ))
+        with Image.open(BytesIO(data)) as image:
+            self.assertEqual(image.size, (100, 300))
+            self.assertFalse(image.getexif())
+
+    def test_image_without_metadata_is_untouched(self):
+        """Небольшая картинка без метаданных не пересохраняется."""
+        self.assertIsNone(prepare(make_image()))
+
+    def test_downscales_to_max_edge(self):
+        """Длинная сторона уменьшается до `max_edge` с сохранением формы."""
+        for format in ('JPEG', 'PNG'):
+            with self.subTest(format=format):
+                data = prepare(make_image((1200, 800), format), max_edge=600)
+                with Image.open(BytesIO(data)) as image:
+                    self.assertEqual(image.format, format)
+                    self.assertEqual(image.size, (600, 400))
+
+    def test_rejects_decompression_bomb(self):
+        """Картинка с огромными размерами в заголовке отклоняется."""
+        data = make_image((4000, 4000), 'PNG')
+        with self.assertRaises(ImageTooLarge):
+            prepare(data, max_pixels=10 ** 6)
+
+    def test_jpeg_limit_applies_to_reduced_size(self):
+        """JPEG декодируется уменьшенным, и лимит проверяется после этого."""
+        data = prepare(make_image((4000, 2000)), max_edge=1000,
+                       max_pixels=10 ** 6)
+        with Image.open(BytesIO(data)) as image:
+            self.assertEqual(image.size, (1000, 500))
+
+    @skipUnless(os.path.exists('/proc/self/status'), 'Нужен procfs.')
+    def test_jpeg_peak_memory(self):
+        """Большой JPEG обрабатывается без декодирования в полном размере."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'big.jpg')
+            subprocess.run([
+                sys.executable, '-c',
+                'import sys; from PIL import Image; '
+                'Image.new("RGB", (6000, 4000), "red").save(sys.argv[1])',
+                path,
+            ], check=True)
+            full, prepared = [
+                int(subprocess.run(
+                    [sys.executable, '-c', MEMORY_SCRIPT, path, mode],
+                    check=True, stdout=subprocess.PIPE,
+                    cwd=settings.BASE_DIR,
+                ).stdout)
+                for mode in ('full', 'prepare')
+            ]
+        # Полностью декодированная картинка занимает около 96 МБ.
+        self.assertGreater(full, 60 * 1024)
+        self.assertLess(prepared, 30 * 1024)
+
+    def test_form_strips_exif(self):
+        """Форма поста сохраняет картинку уже без метаданных."""
+        upload = SimpleUploadedFile(
+            'photo.jpg', make_image(exif={0x010F: 'Camera'}), 'image/jpeg'
+        )
+        form = PostForm({'text': 'Пост'}, {'image': upload})
+        self.assertTrue(form.is_valid())
+        image = form.cleaned_data['image']
+        with Image.open(image) as saved:
+            self.assertFalse(saved.getexif())
+        self.assertEqual(image.name, 'photo.jpg')
+
+    @override_settings(IMAGE_MAX_EDGE=600)
+    def test_form_downscales_to_disk(self):
+        """Уменьшенная картинка пишется формой во временный файл."""
+        upload = SimpleUploadedFile('photo.png', make_image(format='PNG'),
+                                    'image/png')
+        form = PostForm({'text': 'Пост'}, {'image': upload})
+        self.assertTrue(form.is_valid())
+        image = form.cleaned_data['image']
+        self.assertTrue(os.path.exists(image.temporary_file_path()))
+        self.assertEqual(image.size,
+                         os.path.getsize(image.temporary_file_path()))
+        with Image.open(image) as saved:
+            self.assertEqual(saved.size, (600, 400))
+        image.close()
+
+    @override_settings(IMAGE_MAX_PIXELS=10 ** 6)
+    def test_form_rejects_too_large_image(self):
+        """Слишком большая картинка не проходит проверку формы."""
+        upload = SimpleUploadedFile(
+            'photo.png', make_image((2000, 1000), 'PNG'), 'image/png'
+        )
+        form = PostForm({'text': 'Пост'}, {'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'image_too_large')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    """Тестируется фоновое построение картинок карточек."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='MrSmith')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group'
+        )
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            group=cls.group,
+            image=SimpleUploadedFile('card.jpg', make_image(), 'image/jpeg'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        thumbnails.shutdown()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        thumbnails.reset_thumbnail_metrics()
+
+    def test_page_shows_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, страница показывает заглушку."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = Client().get(reverse('index'))
+        self.assertContains(response, 'card-img bg-light')
+        self.assertNotContains(response, '<img class="card-img"')
+        schedule.assert_called_once_with(self.post.image, 1200)
+        self.assertEqual(thumbnails.thumbnail_metrics()['miss'], 1)
+
+    def test_page_shows_ready_thumbnail(self):
+        """Готовая миниатюра показывается без повторного построения."""
+        webp_480, webp_960, jpeg_480, jpeg_960 = thumbnails.build(
+            self.post.image
+        )
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = Client().get(reverse('index'))
+        schedule.assert_not_called()
+        self.assertContains(
+            response,
+            f'<source type="image/webp" '
+            f'srcset="{webp_480.url} 480w, {webp_960.url} 960w"',
+        )
+        self.assertContains(
+            response,
+            f'<img class="card-img" src="{jpeg_960.url}" '
+            f'srcset="{jpeg_480.url} 480w, {jpeg_960.url} 960w"',
+        )
+        self.assertContains(
+            response, 'width="960" height="339" loading="lazy"'
+        )
+
+    def test_thumbnail_tag_finds_built_thumbnail(self):
+        """Тег `{% thumbnail %}` находит миниатюру под тем же ключом."""
+        thumbnail = thumbnails.build(self.post.image)[-1]
+        template = Template(
+            '{% load thumbnail %}'
+            '{% thumbnail image "960x339" crop="center" upscale=True as im %}'
+            '{{ im.name }}{% endthumbnail %}'
+        )
+        self.assertEqual(
+            template.render(Context({'image': self.post.image})),
+            thumbnail.name,
+        )
+
+    def test_prefetch_uses_one_query_per_page(self):
+        """Картинки всех постов страницы находятся одним запросом."""
+        posts = [self.post] + [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.user,
+                image=SimpleUploadedFile(f'p{i}.jpg', make_image(),
+                                         'image/jpeg'),
+            )
+            for i in range(3)
+        ]
+        for post in posts:
+            thumbnails.build(post.image, post.image_width)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch_card_images(posts)
+        self.assertTrue(all(post.prefetched_card_image for post in posts))
+        with self.assertNumQueries(0):
+            thumbnails.prefetch_card_images(posts)
+
+    def test_prefetch_does_not_cache_missing_entries(self):
+        """Отсутствие миниатюры не кешируется: готовая сразу находится."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            thumbnails.prefetch_card_images([self.post])
+        self.assertIsNone(self.post.prefetched_card_image)
+        schedule.assert_called_once_with(self.post.image, 1200)
+        thumbnails.build(self.post.image, self.post.image_width)
+        thumbnails.prefetch_card_images([self.post])
+        self.assertIsNotNone(self.post.prefetched_card_image)
+
+    def test_fallback_keeps_source_format(self):
+        """Запасной вариант строится в формате исходного файла."""
+        formats = [
+            options['format']
+            for _, options in thumbnails.card_variants('posts/image.png')
+        ]
+        self.assertEqual(formats, ['WEBP', 'WEBP', 'PNG', 'PNG'])
+
+    def test_narrow_source_skips_wider_variants(self):
+        """Варианты шире исходной картинки не строятся."""
+        geometries = [
+            geometry
+            for geometry, _ in thumbnails.card_variants('posts/a.jpg', 600)
+        ]
+        self.assertEqual(geometries, ['480x170', '480x170'])
+        self.assertEqual(
+            len(thumbnails.card_variants('posts/a.jpg', 100)), 2
+        )
+
+    def test_queue_full_drops_task(self):
+        """При заполненной очереди задача отбрасывается."""
+        thumbnails._get_executor()
+        with mock.patch.object(thumbnails, '_slots',
+                               threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            self.assertIsNone(thumbnails.submit(self.post.image))
+        self.assertEqual(thumbnails.thumbnail_metrics()['dropped'], 1)
+
+    def test_missing_source_is_skipped(self):
+        """Для несуществующего файла задача не создаётся."""
+        self.assertIsNone(thumbnails.submit('posts/missing.jpg'))
+        self.assertEqual(thumbnails.thumbnail_metrics()['skipped'], 1)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_without_workers_builds_on_render(self):
+        """Без пула миниатюра строится при показе страницы."""
+        response = Client().get(reverse('index'))
+        self.assertContains(response, '<img class="card-img"')
+
+    def test_new_post_schedules_thumbnail(self):
+        """Картинка нового поста ставится в очередь после сохранения."""
+        client = Client()
+        client.force_login(self.user)
+        image = SimpleUploadedFile('new.jpg', make_image(), 'image/jpeg')
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            client.post(reverse('new_post'),
+                        {'text': 'Новый пост', 'image': image})
+        post = Post.objects.get(text='Новый пост')
+        self.assertTrue(post.image)
+        schedule.assert_called_once_with(post.image, 1200)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailPoolTest(TransactionTestCase):
+    """Тестируется построение миниатюры пулом процессов."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def tearDown(self):
+        thumbnails.shutdown()
+
+    def test_worker_builds_thumbnail(self):
+        """Миниатюра строится в другом процессе и попадает в хранилище."""
+        user = User.objects.create_user(username='MrSmith')
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=user,
+            image=SimpleUploadedFile('pool.jpg', make_image(), 'image/jpeg'),
+        )
+        future = thumbnails.submit(post.image)
+        self.assertIsNotNone(future)
+        self.assertIsNone(thumbnails.submit(post.image))
+        future.result(timeout=60)
+        thumbnails.shutdown()
+        card = thumbnails.card_image(post.image)
+        self.assertIsNotNone(card)
+        self.assertTrue(card.fallback.exists())
+        self.assertEqual(list(card.fallback.size), [960, 339])
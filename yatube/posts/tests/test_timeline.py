@@ -0,0 +1,105 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    """Тестируется лента подписок, заполняемая при публикации."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='MrSmith')
+        cls.user = User.objects.create(username='MrAnon')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост автора попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка добавляет посты автора в ленту, отписка — убирает."""
+        for _ in range(3):
+            Post.objects.create(text='Тестовый пост', author=self.author)
+        self.authorized_client.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.user.timeline.count(), 3)
+        self.authorized_client.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.user.timeline.count(), 0)
+
+    def test_follow_index_pages_timeline(self):
+        """Лента подписок делится на страницы по курсору."""
+        Follow.objects.create(user=self.user, author=self.author)
+        for _ in range(13):
+            Post.objects.create(text='Тестовый пост', author=self.author)
+        response = self.authorized_client.get(reverse('follow_index'))
+        page = response.context['page']
+        self.assertEqual(len(page.object_list), 10)
+        self.assertIsInstance(page.object_list[0], Post)
+        response = self.authorized_client.get(
+            reverse('follow_index') + f'?after={page.next_cursor}'
+        )
+        self.assertEqual(len(response.context['page'].object_list), 3)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора читаются при показе ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='Тестовый пост', author=self.author)
+        self.assertEqual(self.user.timeline.count(), 0)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page'].object_list), 1)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_no_longer_popular_is_backfilled(self):
+        """Посты, опубликованные в популярности автора, остаются в ленте."""
+        other = User.objects.create(username='MrOther')
+        Follow.objects.create(user=other, author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        self.assertEqual(self.user.timeline.count(), 0)
+        with self.assertNumQueries(6):
+            Follow.objects.filter(user=other).delete()
+        # Отписка ленты не заполняет, пост по-прежнему читается напрямую.
+        self.assertEqual(self.user.timeline.count(), 0)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page'].object_list), 1)
+
+        out = StringIO()
+        call_command('restore_timelines', stdout=out)
+        self.assertIn('Авторов: 1, лент: 1', out.getvalue())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        stats = UserStats.objects.get(user=self.author)
+        self.assertFalse(stats.needs_backfill)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page'].object_list), 1)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_not_restored(self):
+        """Авторы, всё ещё популярные, остаются с флагом."""
+        other = User.objects.create(username='MrOther')
+        Follow.objects.create(user=other, author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        call_command('restore_timelines', stdout=StringIO())
+        stats = UserStats.objects.get(user=self.author)
+        self.assertTrue(stats.needs_backfill)
+        self.assertEqual(self.user.timeline.count(), 0)
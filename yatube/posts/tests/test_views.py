@@ -457,17 +457,28 @@ class PostCacheTests(TestCase):
         self.authorized_client.force_login(self.author)
 
     def test_cache_index(self):
+        """Главная отдаётся из кеша, пока посты не изменились."""
         response = self.authorized_client.get(reverse('index'))
         number_posts = len(response.context.get('page').object_list)
-        self.post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Изменённый пост')
         response = self.authorized_client.get(reverse('index'))
         self.assertEqual(
-            len(response.context.get('page').object_list),
-            number_posts
+            response.context.get('page').object_list[0].text,
+            'Тестовый пост'
         )
-        cache.clear()
+        self.post.delete()
         response = self.authorized_client.get(reverse('index'))
         self.assertEqual(len(
             response.context.get('page').object_list),
             number_posts - 1
         )
+
+    def test_cache_index_shows_new_post(self):
+        """Новый пост сразу появляется на главной."""
+        self.authorized_client.get(reverse('index'))
+        Post.objects.create(text='Новый пост', author=self.author)
+        response = self.authorized_client.get(reverse('index'))
+        self.assertEqual(
+            response.context.get('page').object_list[0].text,
+            'Новый пост'
+        )
@@ -0,0 +1,434 @@
+"""
+Картинки карточек постов.
+
+Для каждой картинки строится набор вариантов: несколько ширин
+(`CARD_IMAGE_WIDTHS`) в современных форматах (`CARD_IMAGE_FORMATS`)
+и в формате исходного файла для старых браузеров. Шаблон выводит их
+через `<picture>` с `srcset`/`sizes`.
+
+Страница никогда не строит варианты сама: `card_image` только ищет
+готовые в хранилище ключей sorl-thumbnail (для всей страницы сразу —
+`prefetch_card_images`), а при промахе ставит их
+построение в очередь пула процессов и возвращает `None` — шаблон
+показывает заглушку. Новые картинки попадают в очередь сразу после
+сохранения поста (`schedule` срабатывает после фиксации транзакции).
+
+Очередь ограничена `THUMBNAIL_QUEUE_SIZE`: если она заполнена, задача
+отбрасывается и будет поставлена снова при следующем показе карточки.
+Имена и ключи вариантов строятся так же, как у тега `{% thumbnail %}`.
+"""
+import atexit
+import logging
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import \
+    KVStore as CachedDBKVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from .imaging import render_variants
+
+logger = logging.getLogger(__name__)
+
+CARD_GEOMETRY = '960x339'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+CARD_SIZES = '(max-width: 992px) 100vw, 960px'
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+}
+
+_metrics = Counter()
+_lock = threading.Lock()
+_pending = set()
+_executor = None
+_slots = None
+
+
+def _count(event):
+    with _lock:
+        _metrics[event] += 1
+
+
+def thumbnail_metrics():
+    """
+    Счётчики в текущем процессе: `hit`, `miss`, `scheduled`, `dropped`
+    (очередь заполнена), `skipped` (нет исходного файла), `generated`
+    и `failed`.
+    """
+    with _lock:
+        return dict(_metrics)
+
+
+def reset_thumbnail_metrics():
+    with _lock:
+        _metrics.clear()
+
+
+class LookupBackend(ThumbnailBackend):
+    """
+    Бэкенд sorl-thumbnail, который умеет искать миниатюру без создания
+    и знает расширения форматов, которых нет в sorl-thumbnail (AVIF).
+    """
+
+    extensions = {**EXTENSIONS, 'AVIF': 'avif'}
+
+    def prepare(self, file_, geometry_string, options):
+        """Исходный файл, файл миниатюры и полный набор параметров."""
+        options = dict(options)
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return source, ImageFile(name, default.storage), options
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = f'{key[:2]}/{key[2:4]}/{key}'
+        extension = self.extensions[options['format']]
+        return f'{sorl_settings.THUMBNAIL_PREFIX}{path}.{extension}'
+
+    def lookup(self, file_, geometry_string, **options):
+        _, thumbnail, _ = self.prepare(file_, geometry_string, options)
+        return default.kvstore.get(thumbnail)
+
+
+backend = LookupBackend()
+
+
+def lookup(file_, geometry_string=CARD_GEOMETRY, **options):
+    """Готовая миниатюра или `None`; картинка при этом не читается."""
+    if not file_:
+        return None
+    return backend.lookup(file_, geometry_string, **options)
+
+
+def card_widths():
+    return getattr(settings, 'CARD_IMAGE_WIDTHS', (480, 960))
+
+
+def card_formats(name):
+    """Форматы вариантов: сначала современные, последним — исходный."""
+    fallback = backend._get_format(ImageFile(name))
+    modern = getattr(settings, 'CARD_IMAGE_FORMATS', ('WEBP',))
+    return [format for format in modern if format != fallback] + [fallback]
+
+
+def card_variants(name, source_width=None):
+    """
+    Пары (геометрия, параметры) всех вариантов картинки карточки.
+    Если известна ширина исходной картинки, варианты шире неё
+    не строятся (кроме самого узкого).
+    """
+    width, height = parse_geometry(CARD_GEOMETRY)
+    quality = getattr(settings, 'CARD_IMAGE_QUALITY', {})
+    widths = card_widths()
+    if source_width:
+        widths = [w for w in widths if w <= source_width] or widths[:1]
+    variants = []
+    for format in card_formats(name):
+        for variant_width in widths:
+            options = {**CARD_OPTIONS, 'format': format}
+            if format in quality:
+                options['quality'] = quality[format]
+            variant_height = round(variant_width * height / width)
+            variants.append((f'{variant_width}x{variant_height}', options))
+    return variants
+
+
+class CardImage:
+    """Готовые варианты картинки карточки, сгруппированные по форматам."""
+
+    sizes = CARD_SIZES
+
+    def __init__(self, formats):
+        # formats: [(формат, [миниатюры по возрастанию ширины])],
+        # последним идёт формат исходного файла.
+        self.formats = formats
+
+    @staticmethod
+    def _srcset(images):
+        return ', '.join(f'{image.url} {image.width}w' for image in images)
+
+    @property
+    def sources(self):
+        return [
+            {'type': MIME_TYPES[format], 'srcset': self._srcset(images)}
+            for format, images in self.formats[:-1]
+        ]
+
+    @property
+    def fallback(self):
+        return self.formats[-1][1][-1]
+
+    @property
+    def srcset(self):
+        return self._srcset(self.formats[-1][1])
+
+
+def _card_variant_files(file_, source_width):
+    """Пары (формат, файл миниатюры) вариантов картинки карточки."""
+    return [
+        (options['format'], backend.prepare(file_, geometry, options)[1])
+        for geometry, options in card_variants(file_.name, source_width)
+    ]
+
+
+def _get_many(thumbnails):
+    """
+    Записи хранилища ключей для миниатюр: `{ключ: ImageFile}` только
+    для найденных. Для хранилища `cached_db` это один `get_many` к кешу
+    и не больше одного запроса к базе за ненайденными в кеше.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        found = {thumbnail.key: kvstore.get(thumbnail)
+                 for thumbnail in thumbnails}
+        return {key: image for key, image in found.items() if image}
+    keys = {add_prefix(thumbnail.key): thumbnail.key
+            for thumbnail in thumbnails}
+    raw = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in raw]
+    if missing:
+        # Отсутствие записи не кешируется: миниатюру может построить
+        # пул другого процесса, а кеш процессов может быть не общим.
+        rows = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        kvstore.cache.set_many(rows, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        raw.update(rows)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in raw.items() if value != EMPTY_VALUE
+    }
+
+
+def _make_card(variants, found):
+    formats = {}
+    for format, thumbnail in variants:
+        image = found.get(thumbnail.key)
+        if image is None:
+            return None
+        formats.setdefault(format, []).append(image)
+    return CardImage([
+        (format, sorted(images, key=lambda image: image.width))
+        for format, images in formats.items()
+    ])
+
+
+def _resolve(file_, source_width, variants, found):
+    card = _make_card(variants, found)
+    if card is not None:
+        _count('hit')
+        return card
+    _count('miss')
+    if workers() > 0:
+        schedule(file_, source_width)
+        return None
+    try:
+        build(file_, source_width)
+    except Exception:
+        _count('failed')
+        logger.exception('Thumbnail generation failed for %s', file_.name)
+        return None
+    return _make_card(variants, _get_many(
+        thumbnail for _, thumbnail in variants
+    ))
+
+
+def card_image(file_, source_width=None):
+    """Варианты картинки карточки или `None`, если их ещё нет."""
+    if not file_:
+        return None
+    variants = _card_variant_files(file_, source_width)
+    found = _get_many(thumbnail for _, thumbnail in variants)
+    return _resolve(file_, source_width, variants, found)
+
+
+def prefetch_card_images(posts):
+    """
+    Находит варианты картинок сразу для всех постов страницы и сохраняет
+    их в `post.prefetched_card_image`; отсутствующие ставит в очередь.
+    """
+    planned = []
+    for post in posts:
+        post.prefetched_card_image = None
+        if post.image:
+            planned.append((
+                post, _card_variant_files(post.image, post.image_width)
+            ))
+    found = _get_many(
+        thumbnail for _, variants in planned for _, thumbnail in variants
+    )
+    for post, variants in planned:
+        post.prefetched_card_image = _resolve(
+            post.image, post.image_width, variants, found
+        )
+
+
+def workers():
+    return getattr(settings, 'THUMBNAIL_WORKERS', 2)
+
+
+def queue_size():
+    return getattr(settings, 'THUMBNAIL_QUEUE_SIZE', 32)
+
+
+def schedule(file_, source_width=None):
+    """Ставит варианты картинки в очередь после фиксации транзакции."""
+    if file_ and workers() > 0:
+        transaction.on_commit(partial(submit, file_, source_width))
+
+
+def _get_executor():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            # Дочерние процессы не наследуют соединения с базой и потоки
+            # сервера: им нужен только Pillow.
+            _executor = ProcessPoolExecutor(
+                max_workers=workers(),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(queue_size())
+        return _executor
+
+
+def shutdown(wait=True):
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+atexit.register(shutdown, wait=False)
+
+
+def _local_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def _task(file_, source_width):
+    """
+    Исходный файл, файлы вариантов и аргументы `render_variants`.
+    `file_` — файл поля модели или имя файла в хранилище по умолчанию.
+
+    Пути определяются сразу, чтобы процесс пула записал варианты туда,
+    где хранилище было настроено в момент постановки. Если хранилище
+    не локальное, передаётся содержимое файла, а варианты возвращаются
+    байтами и сохраняются через хранилище.
+    """
+    source = ImageFile(file_)
+    thumbnails = []
+    variants = []
+    for geometry, options in card_variants(source.name, source_width):
+        _, thumbnail, options = backend.prepare(file_, geometry, options)
+        thumbnails.append(thumbnail)
+        variants.append((
+            parse_geometry(geometry),
+            options['format'],
+            options['quality'],
+            options.get('progressive', sorl_settings.THUMBNAIL_PROGRESSIVE),
+            _local_path(default.storage, thumbnail.name),
+        ))
+    source_path = _local_path(source.storage, source.name)
+    if source_path is None:
+        with source.storage.open(source.name) as source_file:
+            source_path = source_file.read()
+    return source, thumbnails, (source_path, variants)
+
+
+def _save(source, thumbnails, results):
+    """Сохраняет варианты и регистрирует их в хранилище ключей."""
+    default.kvstore.get_or_set(source)
+    for thumbnail, (data, size) in zip(thumbnails, results):
+        if data is not None and not thumbnail.exists():
+            default.storage.save(thumbnail.name, ContentFile(data))
+        thumbnail.set_size(size)
+        default.kvstore.set(thumbnail, source)
+    _count('generated')
+
+
+def build(file_, source_width=None):
+    """Синхронно строит варианты картинки в текущем процессе."""
+    source, thumbnails, args = _task(file_, source_width)
+    _save(source, thumbnails, render_variants(*args))
+    return thumbnails
+
+
+def submit(file_, source_width=None):
+    """
+    Отправляет построение вариантов картинки в пул процессов. Возвращает
+    `Future` или `None`, если задача уже в очереди, очередь заполнена
+    или исходного файла нет.
+    """
+    source = ImageFile(file_)
+    name = source.name
+    executor = _get_executor()
+    with _lock:
+        if name in _pending:
+            return None
+        if not _slots.acquire(blocking=False):
+            _metrics['dropped'] += 1
+            return None
+        _pending.add(name)
+    try:
+        if not source.exists():
+            _count('skipped')
+            raise FileNotFoundError(name)
+        source, thumbnails, args = _task(file_, source_width)
+        future = executor.submit(render_variants, *args)
+    except Exception:
+        _release(name)
+        logger.debug('Thumbnail for %s was not scheduled', name,
+                     exc_info=True)
+        return None
+    _count('scheduled')
+    future.add_done_callback(partial(_store, name, source, thumbnails))
+    return future
+
+
+def _release(name):
+    with _lock:
+        _pending.discard(name)
+        _slots.release()
+
+
+def _store(name, source, thumbnails, future):
+    """Колбэк пула: регистрирует варианты, построенные в другом процессе."""
+    try:
+        _save(source, thumbnails, future.result())
+    except Exception:
+        _count('failed')
+        logger.exception('Thumbnail generation failed for %s', name)
+    finally:
+        _release(name)
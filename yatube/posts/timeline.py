@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+BATCH_SIZE = 1000
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 10000)
+
+
+def backfill_limit():
+    return getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 1000)
+
+
+def _read_on_demand():
+    # Ленты подписчиков автора с флагом `needs_backfill` неполны, поэтому
+    # его посты читаются при показе ленты, как у популярного.
+    return Q(followers_count__gt=fanout_limit()) | Q(needs_backfill=True)
+
+
+def popular_authors(author_ids):
+    """
+    Авторы, чьи посты не раскладываются по лентам подписчиков:
+    у них слишком много подписчиков, их посты читаются при показе ленты.
+    """
+    return UserStats.objects.filter(
+        _read_on_demand(), user__in=author_ids
+    ).values_list('user_id', flat=True)
+
+
+def skips_fan_out(author_id):
+    """
+    Пропускает ли автор раскладку по лентам. Такой автор помечается
+    флагом `needs_backfill`: если подписчиков станет меньше порога,
+    его посты нужно будет добавить в ленты. Один UPDATE и проверяет,
+    и ставит флаг.
+    """
+    return bool(UserStats.objects.filter(
+        _read_on_demand(), user_id=author_id
+    ).update(needs_backfill=True))
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if skips_fan_out(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту последними постами автора после подписки."""
+    if skips_fan_out(author_id):
+        return
+    _fill(user_id, author_id)
+
+
+def _fill(user_id, author_id):
+    posts = Post.objects.filter(author_id=author_id).exclude(
+        timeline_entries__user_id=user_id
+    ).order_by('-pub_date', '-id').values_list('id', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts[:backfill_limit()]
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def mark_popular():
+    """
+    Ставит флаг `needs_backfill` всем популярным авторам: нужно после
+    вставки подписок без сигналов.
+    """
+    return UserStats.objects.filter(
+        followers_count__gt=fanout_limit()
+    ).update(needs_backfill=True)
+
+
+def restore_fan_out(limit=None):
+    """
+    Заполняет ленты подписчиков авторов, которые перестали быть
+    популярными, и снимает с них флаг `needs_backfill`. Обрабатывает
+    не больше `limit` авторов; возвращает число авторов и подписчиков.
+
+    Флаг снимается до заполнения: новые посты автора с этого момента
+    раскладываются сами, а `_fill` не добавляет записи повторно.
+    """
+    authors = UserStats.objects.filter(
+        needs_backfill=True, followers_count__lte=fanout_limit()
+    ).values_list('user_id', flat=True)
+    if limit is not None:
+        authors = authors[:limit]
+    restored = followers_total = 0
+    for author_id in list(authors):
+        cleared = UserStats.objects.filter(
+            user_id=author_id, needs_backfill=True,
+            followers_count__lte=fanout_limit(),
+        ).update(needs_backfill=False)
+        if not cleared:
+            continue
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        for user_id in followers.iterator():
+            _fill(user_id, author_id)
+            followers_total += 1
+        restored += 1
+    return restored, followers_total
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def follow_feed(user):
+    """
+    Лента подписок пользователя и порядок её сортировки для пагинатора.
+
+    Обычно это диапазон записей `TimelineEntry` пользователя. Если среди
+    авторов есть популярные, их посты читаются напрямую (fan-out on read)
+    и объединяются с записями ленты.
+    """
+    followed = Follow.objects.filter(user=user).values('author')
+    popular = list(popular_authors(followed))
+    if not popular:
+        entries = TimelineEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group'
+        )
+        return entries, ('-pub_date', '-post_id')
+    posts = Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=popular)
+    ).select_related('author', 'group')
+    return posts, ('-pub_date', '-id')
@@ -1,116 +1,127 @@
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
-from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.http import require_GET
 
+from core.object_cache import get_cached, get_cached_or_404
+
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from . import counters, feed_cache, thumbnails, timeline
+from .models import Group, Post, User, Follow, TimelineEntry
+from .paginator import get_paginator, paginate
 
 
 @require_GET
 def index(request):
-    post_list = cache.get('index_page')
-    if post_list is None:
-        post_list = Post.objects.all()
-        cache.set('index_page', post_list, timeout=20)
-    paginator = Paginator(post_list, settings.ITEMS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = get_paginator(feed_cache.index_posts())
+    page = feed_cache.get_index_page(request, paginator)
     return render(request, 'index.html', {'page': page})
 
 
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group).order_by("-pub_date")
-    paginator = Paginator(posts, settings.ITEMS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group = get_cached_or_404(Group, slug=slug)
+    posts = Post.objects.filter(group=group).select_related('author', 'group')
+    page = paginate(request, posts)
     return render(request, 'group.html', {'group': group, 'page': page})
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(
-        author__username=username).select_related('author')
-    paginator = Paginator(post_list, settings.ITEMS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    post_count = post_list.count()
+    author = get_cached_or_404(User, username=username)
+    post_list = Post.objects.filter(author=author).select_related(
+        'author', 'group'
+    )
+    page = paginate(request, post_list)
+    stats = counters.get_user_stats(author)
 
     if request.user.is_authenticated and Follow.objects.filter(
             author=author, user=request.user
     ).exists():
         context = {
             'author': author,
-            'post_count': post_count,
+            'post_count': stats.posts_count,
+            'followers_cnt': stats.followers_count,
+            'follow_cnt': stats.following_count,
             'page': page,
             'following': True
         }
     else:
         context = {
             'author': author,
-            'post_count': post_count,
+            'post_count': stats.posts_count,
+            'followers_cnt': stats.followers_count,
+            'follow_cnt': stats.following_count,
             'page': page,
         }
     return render(request, 'profile.html', context)
 
 
+def _cached_group(group_id):
+    # Группа могла быть удалена: `group_id` обнуляется без сигналов,
+    # и закешированный пост ещё ссылается на неё.
+    try:
+        return get_cached(Group, pk=group_id) if group_id else None
+    except Group.DoesNotExist:
+        return None
+
+
 def post_view(request, username, post_id):
-    post_list = Post.objects.filter(
-        author__username=username).select_related('author')
-    post_count = post_list.count()
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(post_list, id=post_id,
-                             author__username=username)
+    author = get_cached_or_404(User, username=username)
+    post = get_cached_or_404(Post, pk=post_id)
+    if post.author_id != author.pk:
+        raise Http404('Пост не найден.')
+    post.author = author
+    post.group = _cached_group(post.group_id)
+    stats = counters.get_user_stats(author)
     form = CommentForm(instance=None)
     comments = post.comments.select_related('author').all()
-    followers_cnt = Follow.objects.filter(author=post.author).count()
-    follow_cnt = Follow.objects.filter(user=post.author).count()
     context = {
-        'post_count': post_count,
+        'post_count': stats.posts_count,
         'post': post,
         'comments': comments,
         'username': username,
         'author': author,
         'form': form,
-        'followers_cnt': followers_cnt,
-        'follow_cnt': follow_cnt,
+        'followers_cnt': stats.followers_count,
+        'follow_cnt': stats.following_count,
     }
     return render(request, 'post.html', context)
 
 
 @login_required
 def new_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post.image, post.image_width)
         return redirect('index')
     return render(request, 'new.html', {'form': form, 'mode': 'create'})
 
 
 @login_required
 def post_edit(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id, author__username=username)
+    author = get_cached_or_404(User, username=username)
+    # Пост читается из базы, а не из кеша: форма сохраняет все его поля.
+    post = get_object_or_404(Post, id=post_id, author=author)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
         instance=post
     )
-    if request.user != post.author:
+    if request.user != author:
         return redirect('post_view', username, post_id)
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image, post.image_width)
         return redirect('post_edit', username, post_id)
     return render(request, 'new.html', {'form': form, 'post': post})
 
 
 @login_required
 def add_comment(request, username, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_cached_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -119,7 +130,7 @@ def add_comment(request, username, post_id):
         comment.save()
         return redirect(
             'post_view',
-            username=post.author.username,
+            username=get_cached(User, pk=post.author_id).username,
             post_id=post_id
         )
     return render(
@@ -145,16 +156,13 @@ def server_error(request):
 @login_required
 def follow_index(request):
     username = request.user.username
-    follow_posts_list = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author').order_by("-pub_date")
-    paginator = Paginator(follow_posts_list, settings.ITEMS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    feed, ordering = timeline.follow_feed(request.user)
+    page = paginate(request, feed, ordering=ordering)
+    if feed.model is TimelineEntry:
+        page.object_list = [entry.post for entry in page.object_list]
     context = {
         'username': username,
         'page': page,
-        'follow_posts_list': follow_posts_list,
     }
     return render(
         request,
@@ -165,7 +173,7 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_or_404(User, username=username)
     username = request.user.username
     if request.user != author:
         Follow.objects.get_or_create(author=author, user=request.user)
@@ -179,7 +187,7 @@ def profile_follow(request, username):
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_or_404(User, username=username)
     if request.user != author:
         Follow.objects.filter(author=author, user=request.user).delete()
         return redirect('index')
@@ -30,7 +30,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -99,9 +101,28 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+# collectstatic добавляет к именам хеш содержимого, пишет манифест
+# и сжатые копии .gz и .br (если установлен brotli). Файлы с хешем
+# отдаются с кешированием навсегда, остальные — на STATIC_CACHE_MAX_AGE.
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
+STATIC_CACHE_MAX_AGE = 60 * 10
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Как отдавать файлы из MEDIA_ROOT: None — сам Django, 'x-accel-redirect'
+# — через nginx (internal location MEDIA_ACCEL_PREFIX с alias на
+# MEDIA_ROOT), 'x-sendfile' — через Apache mod_xsendfile или lighttpd.
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+# Файлы MEDIA_ROOT, которые не перезаписываются на месте и кешируются
+# на MEDIA_CACHE_MAX_AGE как неизменяемые: картинки постов с хешем
+# содержимого в имени и миниатюры sorl-thumbnail. Остальные файлы
+# (старые загрузки под исходным именем) браузер перепроверяет.
+MEDIA_IMMUTABLE_PATTERNS = (
+    r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$',
+    r'^cache/',
+)
 
 
 LOGIN_URL = '/auth/login/'
@@ -113,12 +134,113 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 ITEMS_PER_PAGE = 10
 
+# Кеш в два уровня: LRU в памяти каждого процесса (LOCAL_MAX_BYTES байт)
+# перед общим для процессов кешем в SQLite. Изменения ключей рассылаются
+# остальным процессам через шину в BUS_LOCATION не позже чем через
+# BUS_POLL_INTERVAL секунд. Для нескольких машин общим кешем нужен
+# memcached или Redis. Каталог кеша свой у каждой копии проекта (его можно
+# задать переменной окружения YATUBE_CACHE_DIR) и закрыт для других
+# пользователей. Тесты запускаются с кешем во временном каталоге
+# (`core.test_runner`), чтобы не видеть и не очищать кеш разработки.
+CACHE_DIR = os.environ.get('YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_BYTES': 32 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 60,
+            'BUS_LOCATION': os.path.join(CACHE_DIR, 'bus.sqlite3'),
+            'BUS_POLL_INTERVAL': 0.05,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
+TEST_RUNNER = 'core.test_runner.IsolatedCacheRunner'
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
+
+# Верхняя граница точного подсчёта записей в ленте (None — без ограничения).
+PAGINATOR_COUNT_LIMIT = 1000
+
+# Посты авторов, у которых подписчиков больше этого числа, не раскладываются
+# по лентам подписчиков, а читаются при показе ленты.
+TIMELINE_FANOUT_LIMIT = 10000
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_BACKFILL_LIMIT = 1000
+
+# Кеш страниц главной: сколько первых страниц кешировать и на какой срок.
+# Кеш сбрасывается при изменении постов, комментариев, групп и авторов
+# (posts/dependencies.py), поэтому срок может быть большим.
+INDEX_CACHE_PAGES = 5
+INDEX_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Кеш готовых страниц для анонимных читателей: имя URL и теги, от которых
+# зависит страница (в них подставляются параметры URL). Теги сбрасываются
+# при изменении записей, от которых они зависят (posts/dependencies.py).
+PAGE_CACHE_VIEWS = {
+    'index': ('index',),
+    'group': ('group:{slug}',),
+    'profile': ('user:{username}',),
+    'post_view': ('user:{username}', 'post:{post_id}'),
+}
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Срок хранения отрендеренных карточек постов. Изменения поста дают
+# карточке новый ключ, поэтому срок нужен только для вытеснения старых.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Миниатюры строятся в фоне пулом из THUMBNAIL_WORKERS процессов; в очереди
+# не больше THUMBNAIL_QUEUE_SIZE задач, лишние отбрасываются до следующего
+# показа карточки. 0 процессов — строить при показе страницы.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_QUEUE_SIZE = 32
+
+# Варианты картинки карточки: ширины и форматы помимо исходного
+# (например, ('AVIF', 'WEBP'), если Pillow собран с libavif), качество
+# по форматам (остальные — THUMBNAIL_QUALITY sorl-thumbnail).
+CARD_IMAGE_WIDTHS = (480, 960)
+CARD_IMAGE_FORMATS = ('WEBP',)
+CARD_IMAGE_QUALITY = {'WEBP': 80, 'AVIF': 60}
+
+# Кеш записей для поиска автора, группы и поста в представлениях
+# (core/object_cache.py): срок для найденной записи и для отсутствующей.
+OBJECT_CACHE_TIMEOUT = 60 * 60
+OBJECT_CACHE_MISS_TIMEOUT = 60
+# Сколько секунд после изменения запись не кладётся обратно в кеш:
+# дольше, чем длится транзакция, в которой её меняют.
+OBJECT_CACHE_TOMBSTONE_TIMEOUT = 10
+
+# Загружаемые картинки уменьшаются так, чтобы длинная сторона была
+# не больше IMAGE_MAX_EDGE. Картинки, для проверки которых пришлось бы
+# декодировать больше IMAGE_MAX_PIXELS пикселей, отклоняются (JPEG
+# декодируется сразу в уменьшенном масштабе, поэтому лимит относится
+# к уже уменьшенному размеру). Загрузки больше FILE_UPLOAD_MAX_MEMORY_SIZE
+# байт Django пишет во временный файл по частям.
+IMAGE_MAX_EDGE = 2560
+IMAGE_MAX_PIXELS = 25 * 10 ** 6
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
+# Бюджет запросов к базе на одну страницу: число запросов и время в секундах.
+# QUERY_BUDGET_ACTION: 'log' — писать предупреждение, 'raise' — исключение.
+QUERY_BUDGET_ACTION = 'log'
+QUERY_BUDGETS = {
+    'default': {'queries': 20, 'db_time': 0.5},
+    'index': {'queries': 8, 'db_time': 0.1},
+    'group': {'queries': 8, 'db_time': 0.1},
+    'profile': {'queries': 10, 'db_time': 0.1},
+    'post_view': {'queries': 10, 'db_time': 0.1},
+    'follow_index': {'queries': 8, 'db_time': 0.1},
+    'new_post': {'queries': 20, 'db_time': 0.2},
+    'post_edit': {'queries': 20, 'db_time': 0.2},
+    'add_comment': {'queries': 15, 'db_time': 0.2},
+    'profile_follow': {'queries': 20, 'db_time': 0.2},
+    'profile_unfollow': {'queries': 20, 'db_time': 0.2},
+}
@@ -1,9 +1,12 @@
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf.urls import handler404, handler500  # noqa
 
+from core.views import serve_media, serve_static
+
 
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
@@ -14,6 +17,14 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
+    re_path(
+        r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+        serve_media, name='media'
+    ),
+    re_path(
+        r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')),
+        serve_static, name='static'
+    ),
     path('', include('posts.urls')),
 ]
 
@@ -23,11 +34,3 @@ if settings.DEBUG:
     urlpatterns += (
         path("__debug__/", include(debug_toolbar.urls)),
     )
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )
-    urlpatterns += static(
-        settings.STATIC_URL,
-        document_root=settings.STATIC_ROOT
-    )